@@ -0,0 +1,322 @@
+# async_crud.py
+import asyncio
+import logging
+import os
+import time
+
+from bson.objectid import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import BulkWriteError
+
+from connection import mongo_settings
+from crud import (AnimalShelter, DEFAULT_BATCH_SIZE, DEFAULT_PAGE_SIZE, DEFAULT_PROJECTION, DEFAULT_TOP_K,
+                  RESCUE_FILTERS, cache_from_env, iter_batches)
+from summaries import SUMMARY_COLLECTION, SUMMARY_FIELDS, RescueSummaries
+
+logger = logging.getLogger('shelter.async_crud')
+
+
+class AsyncAnimalShelter:
+    # asyncio counterpart of AnimalShelter built on Motor. Every method is a coroutine
+    # (or async generator), so async Dash callbacks or a standalone asyncio service can
+    # overlap the DB I/O of concurrent sessions instead of blocking a worker per query.
+    # Query building, derived fields, paging tokens and rescue summary upkeep are shared
+    # with AnimalShelter.
+
+    def __init__(self, cache=None, summaries=None):
+        settings = mongo_settings()
+        logger.info("Connecting (async) %s authentication to %s:%s",
+                    'with' if settings['authenticated'] else 'without', settings['host'], settings['port'])
+
+        try:
+            # Motor clients attach to the running event loop on first use, so each
+            # instance owns its client rather than sharing a class-level singleton
+            self.client = AsyncIOMotorClient(settings['uri'], **settings['options'])
+            self.database = self.client[settings['db_name']]
+            self.collection = self.database[settings['col_name']]
+            self._summaries = RescueSummaries(self.collection, self.database[SUMMARY_COLLECTION], RESCUE_FILTERS)
+        except Exception as e:
+            logger.error("Error initializing MongoDB connection: %s", e)
+            raise
+
+        self._records_updated = 0
+        self._records_matched = 0
+        self._records_deleted = 0
+        self._cache = cache if cache is not None else cache_from_env()
+        # Same switch as AnimalShelter: SHELTER_SUMMARIES=0 turns summary upkeep off
+        if summaries is None:
+            summaries = os.getenv('SHELTER_SUMMARIES', '1') != '0'
+        self._maintain_summaries = summaries
+
+    async def ping(self):
+        started = time.perf_counter()
+        try:
+            await self.client.admin.command('ping')
+            return {'ok': True, 'latency_ms': (time.perf_counter() - started) * 1000, 'error': None}
+        except Exception as e:
+            return {'ok': False, 'latency_ms': (time.perf_counter() - started) * 1000, 'error': str(e)}
+
+    async def create_record(self, data):
+        if not data:
+            raise ValueError("No document to save. Data is empty.")
+        doc = AnimalShelter._with_derived_fields(data)  # raises ValueError for fields of the wrong type
+
+        try:
+            result = await self.collection.insert_one(doc)
+            self._invalidate_cache()
+            await self._update_summaries([], [doc])
+            logger.debug("Inserted document", extra={'id': str(result.inserted_id)})
+            return result.acknowledged
+        except Exception as e:
+            logger.error("Error inserting document: %s", e)
+            return False
+
+    async def create_records(self, docs, batch_size=DEFAULT_BATCH_SIZE, ordered=False):
+        # Same contract as AnimalShelter.create_records
+        summary = {'inserted': 0, 'errors': []}
+        for offset, batch in iter_batches(docs, batch_size):
+            derived, positions, invalid = AnimalShelter._validated(
+                batch, offset, summary['errors'], stop_at_error=ordered)
+            try:
+                if derived:
+                    result = await self.collection.insert_many(derived, ordered=ordered)
+                    summary['inserted'] += len(result.inserted_ids)
+                    await self._update_summaries([], derived)
+            except BulkWriteError as e:
+                summary['inserted'] += e.details.get('nInserted', 0)
+                summary['errors'] += AnimalShelter._write_errors(e, positions)
+                failed = {err.get('index') for err in e.details.get('writeErrors', [])}
+                inserted = derived[:e.details.get('nInserted', 0)] if ordered else \
+                    [doc for i, doc in enumerate(derived) if i not in failed]
+                await self._update_summaries([], inserted)
+                if ordered:
+                    break
+            except Exception as e:
+                logger.error("Error inserting documents: %s", e)
+                summary['errors'].append({'index': offset, 'errmsg': str(e)})
+                if ordered:
+                    break
+            if invalid and ordered:
+                break
+        summary['errors'].sort(key=lambda error: error['index'])
+        self._invalidate_cache()
+        logger.info("Inserted %d documents (%d errors)", summary['inserted'], len(summary['errors']))
+        return summary
+
+    async def get_record_by_id(self, post_id):
+        try:
+            return await self.collection.find_one({'_id': ObjectId(post_id)})
+        except Exception as e:
+            logger.error("Error retrieving document by id: %s", e)
+            return None
+
+    async def get_records(self, criteria=None, projection=None, limit=0, batch_size=None):
+        try:
+            return await self._cached(('get_records', criteria, projection, limit),
+                                      lambda: self._find(criteria, projection, limit, batch_size).to_list(None))
+        except Exception as e:
+            logger.error("Error retrieving documents: %s", e)
+            return []
+
+    async def iter_records(self, criteria=None, projection=None, limit=0, batch_size=None):
+        # Async generator; only one cursor batch is held in memory at a time
+        try:
+            async for doc in self._find(criteria, projection, limit, batch_size):
+                yield doc
+        except Exception as e:
+            logger.error("Error streaming documents: %s", e)
+
+    async def get_page(self, criteria=None, page_size=DEFAULT_PAGE_SIZE, after=None, sort_key='_id', projection=None):
+        # Keyset pagination; same tokens as AnimalShelter.get_page
+        if page_size <= 0:
+            raise ValueError("Page size must be greater than zero.")
+
+        query, sort = AnimalShelter._keyset_query(criteria, after, sort_key)
+        fields, strip = AnimalShelter._keyset_projection(projection, sort_key)
+        try:
+            docs = await self.collection.find(query, fields).sort(sort).limit(page_size).to_list(page_size)
+        except Exception as e:
+            logger.error("Error retrieving page: %s", e)
+            return [], None
+        return AnimalShelter._finish_page(docs, page_size, sort_key, strip)
+
+    async def iter_pages(self, criteria=None, page_size=DEFAULT_PAGE_SIZE, sort_key='_id', projection=None):
+        after = None
+        while True:
+            docs, after = await self.get_page(criteria, page_size, after, sort_key, projection)
+            if docs:
+                yield docs
+            if after is None:
+                break
+
+    async def find_page(self, criteria=None, page=0, page_size=DEFAULT_PAGE_SIZE, sort=None, projection=None):
+        # Offset pagination returning (docs, total); the page and the count run concurrently
+        if page_size <= 0:
+            raise ValueError("Page size must be greater than zero.")
+
+        async def fetch():
+            cursor = self.collection.find(criteria or {}, projection if projection is not None else DEFAULT_PROJECTION)
+            if sort:
+                cursor = cursor.sort(list(sort))
+            return await cursor.skip(max(page, 0) * page_size).limit(page_size).to_list(page_size)
+
+        try:
+            docs, total = await asyncio.gather(
+                self._cached(('find_page', criteria, page, page_size, sort, projection), fetch),
+                self.count_records(criteria),
+            )
+            return docs, total
+        except Exception as e:
+            logger.error("Error retrieving page %s: %s", page, e)
+            return [], 0
+
+    async def count_records(self, criteria=None):
+        try:
+            return await self._cached(('count_records', criteria),
+                                      lambda: self.collection.count_documents(criteria or {}))
+        except Exception as e:
+            logger.error("Error counting documents: %s", e)
+            return 0
+
+    async def get_category_counts(self, criteria=None, field='breed', top_k=DEFAULT_TOP_K, other_label='Other'):
+        pipeline = AnimalShelter._category_pipeline(criteria, field, top_k)
+        try:
+            result = await self._cached(('get_category_counts', pipeline),
+                                        lambda: self.collection.aggregate(pipeline).to_list(None))
+        except Exception as e:
+            logger.error("Error counting %s values: %s", field, e)
+            return []
+        return AnimalShelter._fold_counts(result, top_k, other_label)
+
+    async def update_record(self, query, new_value):
+        if not query:
+            raise ValueError("No search criteria is present.")
+        if not new_value:
+            raise ValueError("No update value is present.")
+        update, refresh = AnimalShelter._derived_update({'$set': new_value})  # raises ValueError for bad types
+
+        try:
+            before = await self._summary_inputs(query)
+            ids = None
+            if refresh:
+                docs = before if before is not None else await self.collection.find(query, {'_id': 1}).to_list(None)
+                ids = [doc['_id'] for doc in docs]
+            result = await self.collection.update_many(query, update)
+            if ids:
+                await self._refresh_locations({'_id': {'$in': ids}})
+            self._invalidate_cache()
+            if before:
+                await self._update_summaries(before, await self._summary_inputs(
+                    {'_id': {'$in': [doc['_id'] for doc in before]}}))
+            self._records_updated = result.modified_count
+            self._records_matched = result.matched_count
+            return result.modified_count > 0
+        except Exception as e:
+            logger.error("Error updating documents: %s", e)
+            return False
+
+    async def delete_record(self, query):
+        if not query:
+            raise ValueError("No search criteria is present.")
+
+        try:
+            before = await self._summary_inputs(query)
+            result = await self.collection.delete_many(query)
+            self._invalidate_cache()
+            if before:
+                await self._update_summaries(before, [])
+            self._records_deleted = result.deleted_count
+            return result.deleted_count > 0
+        except Exception as e:
+            logger.error("Error deleting documents: %s", e)
+            return False
+
+    async def _refresh_locations(self, query):
+        # AnimalShelter._refresh_locations, through Motor
+        try:
+            docs = await self.collection.find(query, {'location_lat': 1, 'location_long': 1}).to_list(None)
+            requests = AnimalShelter._location_requests(docs)
+            if requests:
+                await self.collection.bulk_write(requests, ordered=False)
+        except Exception as e:
+            logger.error("Error recomputing locations (run backfill_derived_fields): %s", e)
+
+    async def _summary_inputs(self, query):
+        # AnimalShelter._summary_inputs, read through Motor
+        if not self._maintain_summaries:
+            return None
+        try:
+            return await self.collection.find(query, SUMMARY_FIELDS).to_list(None)
+        except Exception as e:
+            logger.error("Error reading documents for rescue summaries (run rebuild_summaries): %s", e)
+            return None
+
+    async def _update_summaries(self, before, after):
+        # AnimalShelter._update_summaries: the same $inc upserts, written through Motor
+        if not self._maintain_summaries or not (before or after):
+            return
+        try:
+            requests = self._summaries.requests(before or [], after or [])
+            if requests:
+                await self.database[SUMMARY_COLLECTION].bulk_write(requests, ordered=False)
+        except Exception as e:
+            logger.error("Error updating rescue summaries (run rebuild_summaries): %s", e)
+
+    async def _cached(self, key_parts, fetch):
+        # `fetch` returns an awaitable; errors are never cached
+        if self._cache is None:
+            return await fetch()
+        key = self._cache.make_key(*key_parts)
+        hit, value = self._cache.get(key)
+        if hit:
+            return value
+        value = await fetch()
+        self._cache.set(key, value)
+        return value
+
+    def _invalidate_cache(self):
+        if self._cache is not None:
+            self._cache.clear()
+
+    def _find(self, criteria=None, projection=None, limit=0, batch_size=None):
+        cursor = self.collection.find(criteria or {}, projection if projection is not None else DEFAULT_PROJECTION)
+        if limit:
+            cursor = cursor.limit(limit)
+        if batch_size:
+            cursor = cursor.batch_size(batch_size)
+        return cursor
+
+    def close(self):
+        self.client.close()
+
+    @property
+    def records_updated(self):
+        return self._records_updated
+
+    @property
+    def records_matched(self):
+        return self._records_matched
+
+    @property
+    def records_deleted(self):
+        return self._records_deleted
+
+    @property
+    def cache_hits(self):
+        return self._cache.hits if self._cache is not None else 0
+
+    @property
+    def cache_misses(self):
+        return self._cache.misses if self._cache is not None else 0
+
+
+# Running async_crud.py by itself fetches the first page of every rescue filter concurrently
+if __name__ == "__main__":
+    async def smoke_test():
+        shelter = AsyncAnimalShelter()
+        pages = await asyncio.gather(*(shelter.find_page(criteria, 0, 5) for criteria in RESCUE_FILTERS.values()))
+        for name, (docs, total) in zip(RESCUE_FILTERS, pages):
+            print(f"{name}: {total} matches, first page {len(docs)} records")
+        shelter.close()
+
+    asyncio.run(smoke_test())
@@ -0,0 +1,276 @@
+# benchmark.py
+"""
+Reproducible benchmarks for AnimalShelter and the dashboard callbacks.
+
+Generates a synthetic AAC-shaped dataset, loads it into mongomock (default)
+or a local mongod, then times every CRUD operation, each rescue filter and
+the Dash callbacks. Results can be saved as a baseline and later runs
+compared against it:
+
+    python benchmark.py --sizes 10000,100000 --save baselines/local.json
+    python benchmark.py --sizes 10000 --compare baselines/local.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from contextlib import redirect_stderr, redirect_stdout
+from datetime import datetime, timedelta
+
+from connection import ConnectionManager, mongo_settings, set_connection_manager
+from crud import RESCUE_PROFILES, AnimalShelter
+from instrumentation import MetricsRegistry
+
+RESCUE_TYPES = tuple(RESCUE_PROFILES.names)
+
+# Rough shape of the AAC outcomes data: a few dominant mixes and a long tail
+BREED_WEIGHTS = [
+    ('Pit Bull Mix', 14), ('Labrador Retriever Mix', 12), ('Chihuahua Shorthair Mix', 11),
+    ('German Shepherd Mix', 6), ('Australian Cattle Dog Mix', 3), ('Dachshund Mix', 3),
+    ('Boxer Mix', 2), ('Siberian Husky Mix', 2), ('Border Collie Mix', 2), ('Miniature Poodle Mix', 2),
+    ('Rottweiler Mix', 1.5), ('Golden Retriever Mix', 1), ('Doberman Pinsch Mix', 1), ('Bloodhound Mix', 0.3),
+    ('Newfoundland Mix', 0.3), ('Chesa Bay Retr Mix', 0.3), ('Alaskan Malamute Mix', 0.3),
+    ('Old English Sheepdog Mix', 0.2), ('Domestic Shorthair Mix', 30), ('Domestic Medium Hair Mix', 3),
+]
+SEX_WEIGHTS = [('Neutered Male', 36), ('Spayed Female', 33), ('Intact Male', 12), ('Intact Female', 11),
+               ('Unknown', 8)]
+OUTCOME_WEIGHTS = [('Adoption', 42), ('Transfer', 30), ('Return to Owner', 18), ('Euthanasia', 8), ('Died', 2)]
+COLORS = ['Black/White', 'Brown Tabby', 'Black', 'White', 'Tan/White', 'Brown/White', 'Tricolor', 'Blue']
+NAMES = ['Max', 'Bella', 'Luna', 'Charlie', 'Daisy', 'Rocky', 'Lucy', 'Buddy', 'Coco', 'Milo', 'Bear', 'Sadie']
+
+
+def _weighted(rng, pairs):
+    values, weights = zip(*pairs)
+    return rng.choices(values, weights)[0]
+
+
+def _age_text(weeks):
+    if weeks < 5:
+        return f"{int(weeks)} weeks"
+    if weeks < 52:
+        return f"{int(weeks // 4.345)} months"
+    years = int(weeks // 52)
+    return f"{years} year" if years == 1 else f"{years} years"
+
+
+def generate_animals(count, seed=499):
+    """
+    Yield `count` synthetic outcome records with AAC field names and realistic
+    breed/sex/age/location distributions. The same seed always yields the same data.
+    """
+    rng = random.Random(seed)
+    start = datetime(2014, 1, 1)
+    for i in range(count):
+        breed = _weighted(rng, BREED_WEIGHTS)
+        weeks = round(min(1000.0, rng.expovariate(1 / 110.0)), 6)
+        outcome = start + timedelta(minutes=rng.randrange(5 * 365 * 24 * 60))
+        yield {
+            'rec_num': i + 1,
+            'animal_id': f"A{600000 + i:06d}",
+            'name': rng.choice(NAMES) if rng.random() > 0.3 else '',
+            'animal_type': 'Cat' if breed.startswith('Domestic') else 'Dog',
+            'breed': breed,
+            'color': rng.choice(COLORS),
+            'sex_upon_outcome': _weighted(rng, SEX_WEIGHTS),
+            'age_upon_outcome': _age_text(weeks),
+            'age_upon_outcome_in_weeks': weeks,
+            'outcome_type': _weighted(rng, OUTCOME_WEIGHTS),
+            'datetime': outcome.strftime('%Y-%m-%d %H:%M:%S'),
+            'location_lat': round(rng.gauss(30.42, 0.12), 6),
+            'location_long': round(rng.gauss(-97.65, 0.15), 6),
+        }
+
+
+def _connection(backend, uri, db_name):
+    settings = dict(mongo_settings(), db_name=db_name, col_name='animals')
+    if backend == 'mongomock':
+        import mongomock
+        return ConnectionManager(settings, client_factory=lambda uri, **options: mongomock.MongoClient())
+    if uri:
+        settings['uri'] = uri
+    return ConnectionManager(settings)
+
+
+def _measure(operation, repeat, warmup=1):
+    # Time operation() `repeat` times after warming up; returns per-run seconds and the last result
+    result = None
+    for _ in range(warmup):
+        result = operation()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = operation()
+        timings.append(time.perf_counter() - started)
+    return timings, result
+
+
+def _summarize(timings, documents=0):
+    ordered = sorted(timings)
+    total = sum(timings)
+    return {
+        'runs': len(timings),
+        'mean_ms': statistics.fmean(timings) * 1000,
+        'p50_ms': ordered[len(ordered) // 2] * 1000,
+        'p95_ms': ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] * 1000,
+        'ops_per_s': len(timings) / total if total else float('inf'),
+        'docs_per_op': documents,
+    }
+
+
+def _size_of(result):
+    if isinstance(result, tuple):
+        result = result[0]
+    if isinstance(result, int) and not isinstance(result, bool):
+        return result  # streaming operations return how many documents they saw
+    if isinstance(result, dict) and 'rows' in result:
+        return result['rows']  # a table page packed by encode_table
+    return len(result) if hasattr(result, '__len__') else 0
+
+
+def crud_operations(shelter, get_filter_criteria):
+    # name -> zero-argument callable for each CRUD operation benchmarked
+    operations = {
+        'get_records[All]': lambda: shelter.get_records(),
+        'iter_records[All]': lambda: sum(1 for _ in shelter.get_records(stream=True, batch_size=1000)),
+        'iter_pages[All,1000]': lambda: sum(len(page) for page in shelter.iter_pages(page_size=1000)),
+        'find_page[All,first]': lambda: shelter.find_page(None, 0, 10),
+        'find_page[All,deep]': lambda: shelter.find_page(None, 500, 10),
+        'count_records[All]': lambda: shelter.count_records(),
+        'get_category_counts[All]': lambda: shelter.get_category_counts(),
+        'get_frame[All]': lambda: shelter.get_frame(),
+        'update_record': lambda: shelter.update_record({'animal_id': 'A600001'}, {'name': f"Bench{time.time()}"}),
+        'create_delete_record': lambda: (shelter.create_record({'animal_id': 'BENCH', 'breed': 'Lab'}),
+                                         shelter.delete_record({'animal_id': 'BENCH'})),
+        'apply_changes[100]': lambda: shelter.apply_changes(
+            [({'animal_id': f'A6{n:05d}'}, {'$inc': {'rec_num': 1}}) for n in range(1, 101)]),
+    }
+    for rescue_type in RESCUE_TYPES:
+        criteria = get_filter_criteria(rescue_type)
+        operations[f'get_records[{rescue_type}]'] = lambda c=criteria: shelter.get_records(c)
+        operations[f'find_page[{rescue_type}]'] = lambda c=criteria: shelter.find_page(c, 0, 10)
+        operations[f'get_category_counts[{rescue_type}]'] = lambda c=criteria: shelter.get_category_counts(c)
+    return operations
+
+
+def callback_operations(dashboard):
+    # name -> zero-argument callable for each Dash callback benchmarked
+    operations = {}
+    for rescue_type in ('All',) + RESCUE_TYPES:
+        page = dashboard.decode_table(dashboard.load_dashboard(rescue_type, 0, 10, [], '')[0])
+        operations[f'load_dashboard[{rescue_type}]'] = \
+            lambda t=rescue_type: dashboard.load_dashboard(t, 0, 10, [], '')
+        operations[f'load_dashboard_page[{rescue_type}]'] = \
+            lambda t=rescue_type: dashboard.load_dashboard(t, 1, 10, [], '', full=False)
+        selected = [page[0]['id']] if page else []
+        operations[f'update_map[{rescue_type}]'] = lambda ids=selected: dashboard.update_map(ids, {})
+        operations[f'update_clusters[{rescue_type}]'] = \
+            lambda t=rescue_type: dashboard.update_clusters(None, 10, t, '')
+    return operations
+
+
+def run(size, backend='mongomock', uri=None, repeat=5, seed=499, callbacks=True, batch_size=5000):
+    """
+    Load a synthetic dataset of `size` animals and benchmark every operation.
+    Returns {'load': {...}, 'operations': {name: summary}}.
+    """
+    connection = _connection(backend, uri, f'AAC_bench_{size}')
+    set_connection_manager(connection)  # main.py and any AnimalShelter() now use the stand-in
+    shelter = AnimalShelter(connection=connection, metrics=MetricsRegistry())
+    shelter.collection.drop()
+
+    started = time.perf_counter()
+    shelter.create_records(generate_animals(size, seed), batch_size=batch_size)
+    load_seconds = time.perf_counter() - started
+    shelter.ensure_indexes()
+    results = {'load': {'documents': size, 'seconds': load_seconds, 'docs_per_s': size / load_seconds}}
+
+    # main.py builds its app at import time; keep its console noise out of the report
+    with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+        import main
+    operations = crud_operations(shelter, main.get_filter_criteria)
+    if callbacks:
+        main.shelter = AnimalShelter(connection=connection, cache=None, metrics=MetricsRegistry())
+        operations.update(callback_operations(main))
+
+    results['operations'] = {}
+    for name, operation in operations.items():
+        timings, result = _measure(operation, repeat)
+        results['operations'][name] = _summarize(timings, _size_of(result))
+    connection.close()
+    return results
+
+
+def compare(current, baseline, threshold):
+    # List (size, operation, baseline p50, current p50, ratio) for every slowdown beyond threshold
+    regressions = []
+    for size, result in current['sizes'].items():
+        previous = baseline.get('sizes', {}).get(size)
+        if not previous:
+            continue
+        for name, summary in result['operations'].items():
+            before = previous['operations'].get(name)
+            if not before or not before['p50_ms']:
+                continue
+            ratio = summary['p50_ms'] / before['p50_ms']
+            if ratio > 1 + threshold:
+                regressions.append((size, name, before['p50_ms'], summary['p50_ms'], ratio))
+    return regressions
+
+
+def print_report(report):
+    for size, result in report['sizes'].items():
+        load = result['load']
+        print(f"\n== {int(size):,} animals ({report['backend']}) "
+              f"loaded in {load['seconds']:.2f}s ({load['docs_per_s']:,.0f} docs/s)")
+        print(f"{'operation':40} {'p50 ms':>10} {'p95 ms':>10} {'ops/s':>10} {'docs/op':>10}")
+        for name, s in result['operations'].items():
+            print(f"{name:40} {s['p50_ms']:10.2f} {s['p95_ms']:10.2f} {s['ops_per_s']:10.1f} {s['docs_per_op']:10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark AnimalShelter and the dashboard callbacks.")
+    parser.add_argument('--sizes', default='10000', help="comma-separated dataset sizes, e.g. 10000,100000,1000000")
+    parser.add_argument('--backend', choices=('mongomock', 'mongod'), default='mongomock')
+    parser.add_argument('--uri', help="MongoDB URI for --backend mongod (default: MONGO_* settings)")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=499)
+    parser.add_argument('--no-callbacks', action='store_true', help="skip the Dash callback benchmarks")
+    parser.add_argument('--save', help="write results as a JSON baseline")
+    parser.add_argument('--compare', help="baseline JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="p50 slowdown (fraction) reported as a regression")
+    args = parser.parse_args()
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'backend': args.backend,
+        'python': platform.python_version(),
+        'repeat': args.repeat,
+        'seed': args.seed,
+        'sizes': {},
+    }
+    for size in (int(s) for s in args.sizes.split(',')):
+        report['sizes'][str(size)] = run(size, args.backend, args.uri, args.repeat, args.seed,
+                                         callbacks=not args.no_callbacks)
+    print_report(report)
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved baseline to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}:")
+            for size, name, before, after, ratio in regressions:
+                print(f"  [{size}] {name}: {before:.2f} ms -> {after:.2f} ms ({ratio:.2f}x)")
+            sys.exit(1)
+        print("\nNo regressions against baseline.")
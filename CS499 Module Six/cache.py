@@ -0,0 +1,207 @@
+# cache.py
+import hashlib
+import os
+import pickle
+import stat
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from bson import json_util
+
+
+class QueryCache:
+    # In-process LRU cache for query results with a time-to-live.
+    # Bounded both by number of entries and by the approximate serialized size of
+    # the cached results; whichever limit is hit first evicts the least recently used.
+
+    def __init__(self, ttl=60.0, max_entries=128, max_bytes=64 * 1024 * 1024):
+        if ttl <= 0:
+            raise ValueError("Cache TTL must be greater than zero.")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._bytes = 0
+        self._lock = threading.Lock()  # Dash serves callbacks from several threads
+
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def make_key(*parts):
+        # Normalize criteria/projection/options into a stable string. Keys are sorted so
+        # {'a': 1, 'b': 2} and {'b': 2, 'a': 1} share an entry; compiled regexes and
+        # ObjectIds are handled by bson's extended JSON encoder.
+        return json_util.dumps(parts, sort_keys=True)
+
+    def get(self, key):
+        # Return (hit, value); expired entries count as misses and are dropped
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return True, entry[2]
+            if entry is not None:
+                self._evict(key)
+            self._misses += 1
+            return False, None
+
+    def set(self, key, value):
+        size = len(json_util.dumps(value))
+        if size > self.max_bytes:
+            return  # never let a single huge result flush everything else
+        with self._lock:
+            if key in self._entries:
+                self._evict(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._evict(next(iter(self._entries)))
+
+    def clear(self):
+        # Drop every entry; called after any write to the collection
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _evict(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    @property
+    def size_bytes(self):
+        return self._bytes
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskCache:
+    # Cross-process counterpart of QueryCache with the same interface. Entries are
+    # pickled into one file each under `directory`, so every worker of a multi-process
+    # server shares them; point it at a tmpfs such as /dev/shm to keep them in memory.
+    # Expiry uses file modification times; past max_entries/max_bytes the oldest files go.
+    # Loading a pickle can run code, so the directory must be private to this user: it is
+    # created 0700, and an existing one that another user owns or could write to is refused.
+
+    def __init__(self, directory, ttl=60.0, max_entries=128, max_bytes=64 * 1024 * 1024):
+        if ttl <= 0:
+            raise ValueError("Cache TTL must be greater than zero.")
+        self.directory = directory
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        self._check_private(directory)
+
+        self._hits = 0
+        self._misses = 0
+
+    make_key = staticmethod(QueryCache.make_key)
+
+    @staticmethod
+    def _check_private(directory):
+        # Raise PermissionError unless directory is a real directory, owned by this user
+        # and not writable by group or others
+        info = os.lstat(directory)
+        if not stat.S_ISDIR(info.st_mode):
+            raise PermissionError(f"Cache directory {directory} is not a directory.")
+        if hasattr(os, 'getuid') and info.st_uid != os.getuid():
+            raise PermissionError(f"Cache directory {directory} is owned by another user.")
+        if info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            raise PermissionError(f"Cache directory {directory} is writable by other users; chmod 700 it.")
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + '.pkl')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            if os.stat(path).st_mtime + self.ttl > time.time():
+                with open(path, 'rb') as f:
+                    stored_key, value = pickle.load(f)
+                if stored_key == key:
+                    self._hits += 1
+                    return True, value
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass  # missing, expired mid-read, or being replaced by another worker
+        self._misses += 1
+        return False, None
+
+    def set(self, key, value):
+        data = pickle.dumps((key, value), protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_bytes:
+            return
+        # Write then rename, so readers in other processes never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, self._path(key))
+        except OSError:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            return
+        self._prune()
+
+    def _entries(self):
+        # (mtime, size, path) of every stored entry, oldest first
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pkl'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return sorted(entries)
+
+    def _prune(self):
+        entries = self._entries()
+        count, total = len(entries), sum(size for _, size, _ in entries)
+        expired_before = time.time() - self.ttl
+        for mtime, size, path in entries:
+            if mtime > expired_before and count <= self.max_entries and total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            count -= 1
+            total -= size
+
+    def clear(self):
+        # Drop every entry for every process; called after any write to the collection
+        for _, _, path in self._entries():
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    @property
+    def size_bytes(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def __len__(self):
+        return len(self._entries())
@@ -0,0 +1,129 @@
+# columnar.py
+from array import array
+
+import numpy as np
+import pandas as pd
+
+# Typed columns for the AAC fields the dashboard and analytics use.
+# 'category' columns are dictionary-encoded (int32 codes + one copy of each value),
+# 'float64' columns are packed doubles with NaN for missing values, 'int64' columns
+# use 0 for missing values and 'object' keeps arbitrary Python values.
+DEFAULT_COLUMNS = {
+    'animal_id': 'object',
+    'name': 'category',
+    'animal_type': 'category',
+    'breed': 'category',
+    'color': 'category',
+    'sex_upon_outcome': 'category',
+    'outcome_type': 'category',
+    'age_upon_outcome': 'category',
+    'age_upon_outcome_in_weeks': 'float64',
+    'location_lat': 'float64',
+    'location_long': 'float64',
+}
+
+COLUMN_TYPES = ('float64', 'int64', 'category', 'object')
+
+
+class ColumnBuffers:
+    # Accumulates documents straight into per-column typed buffers in one pass.
+    # Numbers go into array.array buffers that NumPy wraps without copying, and
+    # categorical values are encoded as they arrive, so no list of dicts is ever built.
+
+    def __init__(self, columns=None):
+        self.columns = dict(columns or DEFAULT_COLUMNS)
+        for name, dtype in self.columns.items():
+            if dtype not in COLUMN_TYPES:
+                raise ValueError(f"Unsupported column type {dtype!r} for {name}.")
+
+        self._buffers = {}
+        self._categories = {}
+        for name, dtype in self.columns.items():
+            if dtype == 'float64':
+                self._buffers[name] = array('d')
+            elif dtype == 'int64':
+                self._buffers[name] = array('q')
+            elif dtype == 'category':
+                self._buffers[name] = array('i')
+                self._categories[name] = {}
+            else:
+                self._buffers[name] = []
+        self.rows = 0
+
+    def projection(self):
+        # MongoDB projection fetching only the buffered columns
+        projection = {name: 1 for name in self.columns}
+        projection.setdefault('_id', 0)
+        return projection
+
+    def append(self, doc):
+        for name, dtype in self.columns.items():
+            value = doc.get(name)
+            buffer = self._buffers[name]
+            if dtype == 'float64':
+                buffer.append(self._to_float(value))
+            elif dtype == 'int64':
+                buffer.append(int(value) if isinstance(value, (int, float)) and value == value else 0)
+            elif dtype == 'category':
+                if value is None:
+                    buffer.append(-1)
+                else:
+                    codes = self._categories[name]
+                    code = codes.get(value)
+                    if code is None:
+                        code = codes[value] = len(codes)
+                    buffer.append(code)
+            else:
+                buffer.append(value)
+        self.rows += 1
+
+    def extend(self, docs):
+        for doc in docs:
+            self.append(doc)
+        return self
+
+    def arrays(self):
+        # Return {name: ndarray} for numeric/object columns and
+        # {name: (codes ndarray, categories list)} for categorical ones
+        result = {}
+        for name, dtype in self.columns.items():
+            buffer = self._buffers[name]
+            if dtype == 'float64':
+                result[name] = np.frombuffer(buffer, dtype=np.float64)
+            elif dtype == 'int64':
+                result[name] = np.frombuffer(buffer, dtype=np.int64)
+            elif dtype == 'category':
+                result[name] = (np.frombuffer(buffer, dtype=np.int32), list(self._categories[name]))
+            else:
+                values = np.empty(len(buffer), dtype=object)
+                values[:] = buffer
+                result[name] = values
+        return result
+
+    def to_frame(self):
+        # Build a DataFrame from the buffers; categoricals stay dictionary-encoded
+        data = {}
+        for name, column in self.arrays().items():
+            if isinstance(column, tuple):
+                codes, categories = column
+                data[name] = pd.Categorical.from_codes(codes, categories=categories)
+            else:
+                data[name] = column
+        return pd.DataFrame(data, columns=list(self.columns))
+
+    @staticmethod
+    def _to_float(value):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+        if isinstance(value, str):
+            try:
+                return float(value)
+            except ValueError:
+                pass
+        return float('nan')
+
+
+def read_columns(cursor, columns=None):
+    # Drain a cursor into ColumnBuffers; the cursor's batch size controls how many
+    # documents are in flight at once
+    return ColumnBuffers(columns).extend(cursor)
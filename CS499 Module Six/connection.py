@@ -0,0 +1,186 @@
+# connection.py
+import logging
+import os
+import random
+import threading
+import time
+
+from pymongo import MongoClient
+from pymongo.errors import AutoReconnect, ConnectionFailure, ServerSelectionTimeoutError
+
+logger = logging.getLogger('shelter.connection')
+
+# Errors after which a read is worth retrying on a fresh connection
+RETRYABLE_ERRORS = (AutoReconnect, ConnectionFailure, ServerSelectionTimeoutError)
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, '') else default
+
+
+def mongo_settings():
+    # Load connection details from environment variables
+    user = os.getenv('MONGO_USER')
+    password = os.getenv('MONGO_PASS')
+    host = os.getenv('MONGO_HOST', 'localhost')
+    port = int(os.getenv('MONGO_PORT', '27017'))
+
+    # Decide connection URI based on presence of authentication info
+    if user and password:
+        uri = f'mongodb://{user}:{password}@{host}:{port}'
+    else:
+        uri = f'mongodb://{host}:{port}'
+
+    # Pool and timeout options passed straight to the driver; socket timeout 0 means none
+    options = {
+        'maxPoolSize': _env_int('MONGO_MAX_POOL_SIZE', 50),
+        'minPoolSize': _env_int('MONGO_MIN_POOL_SIZE', 0),
+        'maxIdleTimeMS': _env_int('MONGO_MAX_IDLE_TIME_MS', 300000),
+        'serverSelectionTimeoutMS': _env_int('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000),
+        'connectTimeoutMS': _env_int('MONGO_CONNECT_TIMEOUT_MS', 5000),
+        'socketTimeoutMS': _env_int('MONGO_SOCKET_TIMEOUT_MS', 30000) or None,
+        'waitQueueTimeoutMS': _env_int('MONGO_WAIT_QUEUE_TIMEOUT_MS', 10000),
+    }
+    return {
+        'uri': uri,
+        'host': host,
+        'port': port,
+        'authenticated': bool(user and password),
+        'db_name': os.getenv('MONGO_DB', 'AAC'),
+        'col_name': os.getenv('MONGO_COL', 'animals'),
+        'options': options,
+        'retries': _env_int('MONGO_RETRIES', 3),
+        'backoff_ms': _env_int('MONGO_BACKOFF_MS', 200),
+        'max_backoff_ms': _env_int('MONGO_MAX_BACKOFF_MS', 5000),
+    }
+
+
+class ConnectionManager:
+    # Owns the process-wide MongoClient. The client is only built on first use, so
+    # importing the dashboard never blocks on the database, and it is rebuilt with
+    # exponential backoff when the server goes away.
+
+    def __init__(self, settings=None, client_factory=MongoClient):
+        self.settings = settings or mongo_settings()
+        self._client_factory = client_factory
+        self._client = None
+        self._lock = threading.Lock()
+        self._reconnects = 0
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._connect()
+        return self._client
+
+    def database(self, name=None):
+        return self.client[name or self.settings['db_name']]
+
+    def collection(self, name=None, db_name=None):
+        return self.database(db_name)[name or self.settings['col_name']]
+
+    def _connect(self):
+        host, port = self.settings['host'], self.settings['port']
+        logger.info("Connecting %s authentication to %s:%s",
+                    'with' if self.settings['authenticated'] else 'without', host, port,
+                    extra={'host': host, 'port': port})
+        try:
+            # The driver connects in the background; the first operation waits at most
+            # serverSelectionTimeoutMS for a usable server
+            return self._client_factory(self.settings['uri'], **self.settings['options'])
+        except Exception as e:
+            logger.error("Error initializing MongoDB connection: %s", e)
+            raise
+
+    def ping(self):
+        # Cheap health check: one round trip to the server.
+        # Returns {'ok': bool, 'latency_ms': float, 'error': str or None}
+        started = time.perf_counter()
+        try:
+            self.client.admin.command('ping')
+            return {'ok': True, 'latency_ms': (time.perf_counter() - started) * 1000, 'error': None}
+        except Exception as e:
+            return {'ok': False, 'latency_ms': (time.perf_counter() - started) * 1000, 'error': str(e)}
+
+    def reconnect(self):
+        # Drop the current client (and its pool) and build a fresh one on next use
+        with self._lock:
+            if self._client is not None:
+                try:
+                    self._client.close()
+                except Exception:
+                    pass
+            self._client = None
+            self._reconnects += 1
+
+    def run(self, operation, retries=None):
+        # Run operation(), retrying connection-level failures with exponential backoff
+        # and jitter. Use it for reads; writes rely on the driver's retryable writes.
+        retries = self.settings['retries'] if retries is None else retries
+        attempt = 0
+        while True:
+            try:
+                return operation()
+            except RETRYABLE_ERRORS as e:
+                if attempt >= retries:
+                    raise
+                delay_ms = min(self.settings['max_backoff_ms'], self.settings['backoff_ms'] * 2 ** attempt)
+                delay_ms *= random.uniform(0.5, 1.0)
+                logger.warning("MongoDB unavailable (%s); retrying in %.0f ms", e, delay_ms,
+                               extra={'attempt': attempt + 1, 'delay_ms': round(delay_ms)})
+                time.sleep(delay_ms / 1000)
+                if isinstance(e, ServerSelectionTimeoutError):
+                    self.reconnect()
+                attempt += 1
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    @property
+    def connected(self):
+        return self._client is not None
+
+    @property
+    def reconnects(self):
+        return self._reconnects
+
+
+_shared_manager = None
+_shared_lock = threading.Lock()
+
+
+def get_connection_manager():
+    # Process-wide manager shared by every AnimalShelter, like the old class-level client
+    global _shared_manager
+    if _shared_manager is None:
+        with _shared_lock:
+            if _shared_manager is None:
+                _shared_manager = ConnectionManager()
+    return _shared_manager
+
+
+def _reset_after_fork():
+    # A forked worker must not reuse the parent's sockets: drop the inherited client
+    # (without closing it, which would disturb the parent) so the child connects afresh
+    if _shared_manager is not None:
+        _shared_manager._client = None
+        _shared_manager._lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def set_connection_manager(manager):
+    # Replace the process-wide manager, e.g. to point every AnimalShelter at a
+    # stand-in database for benchmarks. Returns the previous manager.
+    global _shared_manager
+    with _shared_lock:
+        previous, _shared_manager = _shared_manager, manager
+    return previous
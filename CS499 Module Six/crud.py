@@ -1,92 +1,794 @@
 # crud.py
+import logging
 import os
-from pymongo import MongoClient
+import sys
+from pymongo import ASCENDING, GEOSPHERE, DeleteMany, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError
 from bson.objectid import ObjectId
 from dotenv import load_dotenv
+from cache import DiskCache, QueryCache
+from connection import get_connection_manager
+from instrumentation import REGISTRY, configure_logging
+from models import ANIMAL_JSON_SCHEMA, Animal, validate_fields
+from rescue_profiles import load_profiles
+from summaries import SUMMARY_COLLECTION, RescueSummaries
 
 # Load environment variables from .env to securely access DB credentials
 load_dotenv()
 
+logger = logging.getLogger('shelter.crud')
+
+# Rescue types, loaded from rescue_profiles.json (or SHELTER_RESCUE_PROFILES). Breed matching
+# happens once on write and is stored in `rescue_categories`, so rescue filters become indexed
+# equality lookups instead of per-document regex scans.
+RESCUE_PROFILES = load_profiles()
+
+# Compiled criteria for each rescue type: qualifying breed plus the sex, age (in weeks) and
+# area the training programs accept
+RESCUE_FILTERS = RESCUE_PROFILES.filters()
+
+# Indexes the dashboard relies on. The rescue filter index follows equality-then-range
+# order (category, sex, then age) so all three predicates are answered from the index.
+INDEX_SPECS = [
+    {'keys': [('rescue_categories', ASCENDING), ('sex_upon_outcome', ASCENDING),
+              ('age_upon_outcome_in_weeks', ASCENDING)], 'name': 'rescue_filter'},
+    {'keys': [('breed', ASCENDING)], 'name': 'breed'},
+    {'keys': [('animal_id', ASCENDING)], 'name': 'animal_id'},
+    {'keys': [('rec_num', ASCENDING)], 'name': 'rec_num'},
+    {'keys': [('location', GEOSPHERE)], 'name': 'location_2dsphere'},
+]
+
+# Field identifying one row. AAC data has a row per outcome, so an animal_id repeats
+# across an animal's outcomes; rec_num, the dataset's row number, does not.
+ROW_KEY = 'rec_num'
+# Newest outcome first, for lookups by animal_id
+LATEST_OUTCOME = [('datetime', -1), (ROW_KEY, -1)]
+
+# Exclude MongoDB internal _id and derived fields from returned documents by default
+DEFAULT_PROJECTION = {'_id': 0, 'rescue_categories': 0, 'location': 0}
+DEFAULT_PAGE_SIZE = 100
+DEFAULT_TOP_K = 10
+DEFAULT_BATCH_SIZE = 1000
+
+# Fields other fields are derived from; apply_changes only lets $set/$unset touch them
+DERIVED_INPUTS = ('breed', 'location_lat', 'location_long')
+LOCATION_INPUTS = ('location_lat', 'location_long')
+
+# Map clustering: grid cells per 256px map tile, and the most clusters one request returns
+GRID_CELLS_PER_TILE = 4
+MAX_CLUSTERS = 2000
+
+def rescue_categories_for(breed):
+    # Return the rescue types whose breed fragments appear in the given breed name
+    return RESCUE_PROFILES.categories_for(breed)
+
+
+def location_point(lat, long):
+    # Build a GeoJSON point from location_lat/location_long, or None if they aren't valid
+    try:
+        lat, long = float(lat), float(long)
+    except (TypeError, ValueError):
+        return None
+    if not (-90.0 <= lat <= 90.0 and -180.0 <= long <= 180.0):
+        return None
+    return {'type': 'Point', 'coordinates': [long, lat]}
+
+
+def viewport_polygon(bounds):
+    # Leaflet bounds [[south, west], [north, east]] as a GeoJSON polygon for $geoWithin,
+    # or None when the viewport spans too much of the globe for a single polygon
+    (south, west), (north, east) = bounds
+    south, north = max(-90.0, float(south)), min(90.0, float(north))
+    west, east = max(-180.0, float(west)), min(180.0, float(east))
+    if east - west >= 180.0 or north - south >= 180.0:
+        return None
+    return {'type': 'Polygon', 'coordinates': [[[west, south], [east, south], [east, north], [west, north],
+                                                [west, south]]]}
+
+
+def cluster_cell_degrees(zoom):
+    # Width of one clustering grid cell at a Leaflet zoom level
+    return 360.0 / (2 ** max(0, int(zoom))) / GRID_CELLS_PER_TILE
+
+
+def cache_from_env(default_ttl=None):
+    # Build a cache when SHELTER_CACHE_TTL (seconds) is set or a default TTL is given, else None.
+    # With SHELTER_CACHE_DIR set it is a DiskCache shared by every process using that directory.
+    cache_ttl = os.getenv('SHELTER_CACHE_TTL') or default_ttl
+    if not cache_ttl:
+        return None
+    options = {
+        'ttl': float(cache_ttl),
+        'max_entries': int(os.getenv('SHELTER_CACHE_MAX_ENTRIES', '128')),
+        'max_bytes': int(os.getenv('SHELTER_CACHE_MAX_BYTES', str(64 * 1024 * 1024))),
+    }
+    cache_dir = os.getenv('SHELTER_CACHE_DIR')
+    if cache_dir:
+        return DiskCache(cache_dir, **options)
+    return QueryCache(**options)
+
+
+def shelter_from_env(cache=None):
+    # The shelter the dashboard reads from: an AnimalShelter on MongoDB, or with
+    # SHELTER_BACKEND=memory a read-only in-memory snapshot (see memory_backend.py) mapped
+    # from SHELTER_SNAPSHOT, so the dashboard keeps working with no database at all
+    if os.getenv('SHELTER_BACKEND', 'mongo') == 'memory':
+        from memory_backend import MemoryShelter
+
+        return MemoryShelter.from_env()
+    return AnimalShelter(cache=cache)
+
+
+def iter_batches(docs, batch_size):
+    # Split any iterable of documents into (offset, list) chunks without materializing it
+    if batch_size <= 0:
+        raise ValueError("Batch size must be greater than zero.")
+    batch, offset = [], 0
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) == batch_size:
+            yield offset, batch
+            offset += len(batch)
+            batch = []
+    if batch:
+        yield offset, batch
+
+
 class AnimalShelter:
-    # Singleton MongoClient to avoid reconnecting repeatedly
-    _client = None
-
-    def __init__(self):
-        # Load connection details from environment variables
-        user = os.getenv('MONGO_USER')
-        password = os.getenv('MONGO_PASS')
-        host = os.getenv('MONGO_HOST', 'localhost')
-        port = int(os.getenv('MONGO_PORT', '27017'))
-        db_name = os.getenv('MONGO_DB', 'AAC')
-        col_name = os.getenv('MONGO_COL', 'animals')
-
-        # Decide connection URI based on presence of authentication info
-        if user and password:
-            mongo_uri = f'mongodb://{user}:{password}@{host}:{port}'
-            print(f"Connecting with authentication to {host}:{port}")
-        else:
-            mongo_uri = f'mongodb://{host}:{port}'
-            print(f"Connecting without authentication to {host}:{port}")
 
-        try:
-            # Initialize the MongoClient if it hasn't been created yet
-            if AnimalShelter._client is None:
-                AnimalShelter._client = MongoClient(mongo_uri)
-            self.client = AnimalShelter._client
-
-            # Access the specified database and collection
-            self.database = self.client[db_name]
-            self.collection = self.database[col_name]
-            print("MongoDB connection successful.")
-        except Exception as e:
-            print(f"Error initializing MongoDB connection: {e}")
-            raise
+    def __init__(self, cache=None, connection=None, metrics=None, log=None, summaries=None):
+        # All instances share one lazily-connected client (see connection.py), so
+        # constructing an AnimalShelter never touches the network
+        self._connection = connection or get_connection_manager()
 
         # Keep counters to track how many records are updated/ deleted during operations
         self._records_updated = 0
         self._records_matched = 0
         self._records_deleted = 0
 
+        # Optional query-result cache; pass one in or enable it with SHELTER_CACHE_TTL (seconds)
+        self._cache = cache if cache is not None else cache_from_env()
+
+        # Pluggable instrumentation: per-operation latency metrics and a standard logger
+        self._metrics = metrics or REGISTRY
+        self._log = log or logger
+
+        # Materialized rescue summaries kept current on every write (SHELTER_SUMMARIES=0 turns
+        # the upkeep off, e.g. for bulk loads followed by rebuild_summaries())
+        if summaries is None:
+            summaries = os.getenv('SHELTER_SUMMARIES', '1') != '0'
+        self._maintain_summaries = summaries
+        self._summaries = None
+
+    # The client, database and collection resolve on first use
+    @property
+    def client(self):
+        return self._connection.client
+
+    @property
+    def database(self):
+        return self._connection.database()
+
+    @property
+    def collection(self):
+        return self._connection.collection()
+
+    @property
+    def summaries(self):
+        if self._summaries is None:
+            self._summaries = RescueSummaries(self.collection, self.database[SUMMARY_COLLECTION], RESCUE_FILTERS)
+        return self._summaries
+
+    def ping(self):
+        # Health check: {'ok': bool, 'latency_ms': float, 'error': str or None}
+        return self._connection.ping()
+
     def create_record(self, data):
         # Check input data before trying to insert
         if not data:
             raise ValueError("No document to save. Data is empty.")
+        doc = self._with_derived_fields(data)  # raises ValueError for fields of the wrong type
 
-        try:
-            # Insert a single record and print the new document's unique ID
-            result = self.collection.insert_one(data)
-            print(f"Inserted document with id: {result.inserted_id}")
-            return result.acknowledged
-        except Exception as e:
-            print(f"Error inserting document: {e}")
-            return False
+        with self._metrics.timer('create_record') as timer:
+            try:
+                # Insert a single record and log the new document's unique ID
+                result = self.collection.insert_one(doc)
+                self._invalidate_cache()
+                self._update_summaries([], [doc])
+                timer.documents = 1
+                self._log.debug("Inserted document", extra={'id': str(result.inserted_id)})
+                return result.acknowledged
+            except Exception as e:
+                timer.error = True
+                self._log.error("Error inserting document: %s", e)
+                return False
+
+    def create_records(self, docs, batch_size=DEFAULT_BATCH_SIZE, ordered=False):
+        # Insert many documents with insert_many, batch_size per round trip.
+        # Unordered mode keeps going past bad documents; ordered mode stops at the first error.
+        # Documents that fail validation are reported as errors and never sent.
+        # Returns {'inserted': n, 'errors': [...]} summed over all batches.
+        summary = {'inserted': 0, 'errors': []}
+        for offset, batch in iter_batches(docs, batch_size):
+            derived, positions, invalid = self._validated(batch, offset, summary['errors'], stop_at_error=ordered)
+            with self._metrics.timer('create_records') as timer:
+                try:
+                    if derived:
+                        result = self.collection.insert_many(derived, ordered=ordered)
+                        summary['inserted'] += len(result.inserted_ids)
+                        timer.documents = len(result.inserted_ids)
+                        self._update_summaries([], derived)
+                except BulkWriteError as e:
+                    summary['inserted'] += e.details.get('nInserted', 0)
+                    summary['errors'] += self._write_errors(e, positions)
+                    timer.documents, timer.error = e.details.get('nInserted', 0), True
+                    failed = {err.get('index') for err in e.details.get('writeErrors', [])}
+                    inserted = derived[:e.details.get('nInserted', 0)] if ordered else \
+                        [doc for i, doc in enumerate(derived) if i not in failed]
+                    self._update_summaries([], inserted)
+                    if ordered:
+                        break
+                except Exception as e:
+                    self._log.error("Error inserting documents: %s", e)
+                    summary['errors'].append({'index': offset, 'errmsg': str(e)})
+                    timer.error = True
+                    if ordered:
+                        break
+            if invalid and ordered:
+                break
+        summary['errors'].sort(key=lambda error: error['index'])
+        self._invalidate_cache()
+        self._log.info("Inserted %d documents (%d errors)", summary['inserted'], len(summary['errors']),
+                       extra={'inserted': summary['inserted'], 'errors': len(summary['errors'])})
+        return summary
+
+    def upsert_records(self, docs, key=ROW_KEY, batch_size=DEFAULT_BATCH_SIZE, ordered=False):
+        # Insert or update many documents matched on `key` using bulk_write, so re-importing
+        # a dataset updates existing rows instead of duplicating them. The key has to be
+        # unique per row: upserting outcome rows on animal_id would fold each animal's
+        # outcomes into one document. Fields not present in a document are left untouched.
+        # Unordered mode keeps going past bad documents; ordered mode stops at the first,
+        # whether it lacks the key, fails validation or fails to write.
+        # Returns {'upserted', 'modified', 'matched', 'errors'}.
+        summary = {'upserted': 0, 'modified': 0, 'matched': 0, 'errors': []}
+        for offset, batch in iter_batches(docs, batch_size):
+            requests, positions, values, refreshed, invalid = [], [], [], [], False
+            for index, doc in enumerate(batch, offset):
+                try:
+                    if doc.get(key) is None:
+                        raise ValueError(f"Missing upsert key '{key}'")
+                    change, refresh = self._derived_update({'$set': doc}, partial=False)
+                except ValueError as e:
+                    summary['errors'].append({'index': index, 'errmsg': str(e)})
+                    invalid = True
+                    if ordered:
+                        break
+                    continue
+                positions.append(index)
+                values.append(change['$set'][key])
+                requests.append(UpdateOne({key: values[-1]}, change, upsert=True))
+                if refresh:
+                    refreshed.append(values[-1])
+            if not requests:
+                if invalid and ordered:
+                    break
+                continue
+            with self._metrics.timer('upsert_records') as timer:
+                timer.documents = len(requests)
+                keys = {'$in': values}
+                before = self._summary_inputs({key: keys})
+                try:
+                    result = self.collection.bulk_write(requests, ordered=ordered)
+                    summary['upserted'] += result.upserted_count
+                    summary['modified'] += result.modified_count
+                    summary['matched'] += result.matched_count
+                except BulkWriteError as e:
+                    summary['upserted'] += e.details.get('nUpserted', 0)
+                    summary['modified'] += e.details.get('nModified', 0)
+                    summary['matched'] += e.details.get('nMatched', 0)
+                    summary['errors'] += self._write_errors(e, positions)
+                    timer.error = True
+                    if ordered:
+                        break
+                except Exception as e:
+                    self._log.error("Error upserting documents: %s", e)
+                    summary['errors'].append({'index': offset, 'errmsg': str(e)})
+                    timer.error = True
+                    if ordered:
+                        break
+                finally:
+                    if refreshed:
+                        self._refresh_locations({key: {'$in': refreshed}})
+                    if before is not None:
+                        self._update_summaries(before, self._summary_inputs({key: keys}))
+            if invalid and ordered:
+                break
+        summary['errors'].sort(key=lambda error: error['index'])
+        self._invalidate_cache()
+        self._log.info("Upserted %d, modified %d documents (%d errors)",
+                       summary['upserted'], summary['modified'], len(summary['errors']),
+                       extra={'upserted': summary['upserted'], 'modified': summary['modified'],
+                              'errors': len(summary['errors'])})
+        return summary
+
+    @classmethod
+    def _validated(cls, batch, offset, errors, stop_at_error=False, partial=False):
+        # Validate and derive each document of a batch. Returns (docs, positions, invalid):
+        # the documents that passed, their positions in the caller's input, and whether any
+        # failed. Failures are appended to `errors`; stop_at_error ends the batch at the first.
+        docs, positions, invalid = [], [], False
+        for index, doc in enumerate(batch, offset):
+            try:
+                docs.append(cls._with_derived_fields(doc, partial=partial))
+                positions.append(index)
+            except ValueError as e:
+                errors.append({'index': index, 'errmsg': str(e)})
+                invalid = True
+                if stop_at_error:
+                    break
+        return docs, positions, invalid
+
+    @staticmethod
+    def _write_errors(error, positions):
+        # Reduce a BulkWriteError to index/code/message entries, mapping each failed
+        # request back to the position of its document in the caller's input
+        return [{'index': positions[err.get('index', 0)], 'code': err.get('code'), 'errmsg': err.get('errmsg')}
+                for err in error.details.get('writeErrors', [])]
 
     def get_record_by_id(self, post_id):
         # Retrieve one document by its MongoDB ObjectId
+        with self._metrics.timer('get_record_by_id') as timer:
+            try:
+                doc = self.collection.find_one({'_id': ObjectId(post_id)})
+                timer.documents = int(doc is not None)
+                self._log.debug("Retrieved document by id", extra={'id': str(post_id), 'found': doc is not None})
+                return doc
+            except Exception as e:
+                timer.error = True
+                self._log.error("Error retrieving document by id %s: %s", post_id, e)
+                return None
+
+    def get_animal(self, animal_id, projection=None):
+        # Look up an animal's latest outcome by its shelter animal_id (indexed)
+        with self._metrics.timer('get_animal') as timer:
+            try:
+                doc = self._cached(('get_animal', animal_id, projection), lambda: self.collection.find_one(
+                    {'animal_id': animal_id}, projection if projection is not None else DEFAULT_PROJECTION,
+                    sort=LATEST_OUTCOME))
+                timer.documents = int(doc is not None)
+                return doc
+            except Exception as e:
+                timer.error = True
+                self._log.error("Error retrieving animal %s: %s", animal_id, e)
+                return None
+
+    def get_row(self, row_id, projection=None):
+        # Look up one outcome row by its ROW_KEY (indexed), e.g. for the map's selected row
+        with self._metrics.timer('get_row') as timer:
+            try:
+                doc = self._cached(('get_row', row_id, projection), lambda: self.collection.find_one(
+                    {ROW_KEY: row_id}, projection if projection is not None else DEFAULT_PROJECTION))
+                timer.documents = int(doc is not None)
+                return doc
+            except Exception as e:
+                timer.error = True
+                self._log.error("Error retrieving row %s: %s", row_id, e)
+                return None
+
+    def get_animals(self, criteria=None, limit=0, batch_size=None):
+        # Matching records as compact Animal objects (see models.py) instead of dicts
+        with self._metrics.timer('get_animals') as timer:
+            try:
+                animals = [Animal.from_document(doc, validate=False)
+                           for doc in self._find(criteria, None, limit, batch_size)]
+                timer.documents = len(animals)
+                return animals
+            except Exception as e:
+                timer.error = True
+                self._log.error("Error retrieving animals: %s", e, extra={'criteria': criteria})
+                return []
+
+    def get_records(self, criteria=None, projection=None, limit=0, batch_size=None, stream=False):
+        # Fetch documents matching criteria or all if none specified.
+        # With stream=True a generator is returned instead of a list, so large result
+        # sets are pulled from the server one batch at a time with constant memory.
+        if stream:
+            return self.iter_records(criteria, projection, limit, batch_size)
+
+        with self._metrics.timer('get_records') as timer:
+            try:
+                docs = self._cached(('get_records', criteria, projection, limit),
+                                    lambda: list(self._find(criteria, projection, limit, batch_size)))
+                timer.count(docs)
+                self._log.debug("Found %d documents", len(docs), extra={'criteria': criteria})
+                return docs
+            except Exception as e:
+                timer.error = True
+                self._log.error("Error retrieving documents: %s", e, extra={'criteria': criteria})
+                return []
+
+    def iter_records(self, criteria=None, projection=None, limit=0, batch_size=None):
+        # Generator version of get_records; only one cursor batch is held in memory at a time
         try:
-            doc = self.collection.find_one({'_id': ObjectId(post_id)})
-            print(f"Retrieved document by id: {doc}")
-            return doc
+            for doc in self._find(criteria, projection, limit, batch_size):
+                yield doc
         except Exception as e:
-            print(f"Error retrieving document by id: {e}")
-            return None
+            self._log.error("Error streaming documents: %s", e, extra={'criteria': criteria})
 
-    def get_records(self, criteria=None):
-        # Fetch documents matching criteria or all if none specified
-        try:
-            if criteria:
-                print(f"Finding documents with criteria: {criteria}")
-                cursor = self.collection.find(criteria, {'_id': 0})  # exclude MongoDB internal _id by default
+    def get_page(self, criteria=None, page_size=DEFAULT_PAGE_SIZE, after=None, sort_key='_id', projection=None):
+        # Keyset pagination: return (docs, next_after) for the page that follows `after`.
+        # `after` is the token returned by the previous call (None for the first page) and
+        # next_after is None once the last page has been read. Paging by a range on the
+        # sort key instead of skip() keeps every page an index seek, however deep it is.
+        if page_size <= 0:
+            raise ValueError("Page size must be greater than zero.")
+
+        query, sort = self._keyset_query(criteria, after, sort_key)
+        fields, strip = self._keyset_projection(projection, sort_key)
+
+        with self._metrics.timer('get_page') as timer:
+            try:
+                docs = timer.count(list(self.collection.find(query, fields).sort(sort).limit(page_size)))
+            except Exception as e:
+                timer.error = True
+                self._log.error("Error retrieving page: %s", e, extra={'criteria': criteria})
+                return [], None
+        return self._finish_page(docs, page_size, sort_key, strip)
+
+    def iter_pages(self, criteria=None, page_size=DEFAULT_PAGE_SIZE, sort_key='_id', projection=None):
+        # Walk the whole result set page by page, e.g. for batch jobs
+        after = None
+        while True:
+            docs, after = self.get_page(criteria, page_size, after, sort_key, projection)
+            if docs:
+                yield docs
+            if after is None:
+                break
+
+    def get_columns(self, criteria=None, columns=None, batch_size=DEFAULT_BATCH_SIZE):
+        # Columnar fetch: stream matching documents straight into typed NumPy buffers
+        # for the requested {field: type} columns (see columnar.DEFAULT_COLUMNS).
+        # Returns a columnar.ColumnBuffers; call .arrays() or .to_frame() on it.
+        from columnar import ColumnBuffers  # NumPy/pandas are only needed for this mode
+
+        buffers = ColumnBuffers(columns)
+        with self._metrics.timer('get_columns') as timer:
+            try:
+                cursor = self.collection.find(criteria or {}, buffers.projection()).batch_size(batch_size)
+                buffers.extend(cursor)
+                timer.documents = buffers.rows
+                self._log.debug("Read %d documents into %d columns", buffers.rows, len(buffers.columns))
+            except Exception as e:
+                timer.error = True
+                self._log.error("Error reading columns: %s", e, extra={'criteria': criteria})
+                return ColumnBuffers(columns)
+        return buffers
+
+    def get_frame(self, criteria=None, columns=None, batch_size=DEFAULT_BATCH_SIZE):
+        # DataFrame built in one pass from get_columns, with categorical breed/sex columns
+        return self.get_columns(criteria, columns, batch_size).to_frame()
+
+    def live_view(self, filters, projection=None, mode=None):
+        # Incrementally updated in-memory result sets for the named filters ({name: criteria}),
+        # fed by a change stream, or by polling where change streams aren't available.
+        # mode is 'auto', 'stream' or 'poll' (default SHELTER_LIVE_MODE or 'auto').
+        from live_view import LiveView
+
+        return LiveView(self, filters, projection, mode=mode or os.getenv('SHELTER_LIVE_MODE', 'auto'))
+
+    def export_snapshot(self, path=None, batch_size=DEFAULT_BATCH_SIZE):
+        # Write the collection to a memory-mappable columnar snapshot directory (see snapshot.py),
+        # default SHELTER_SNAPSHOT or shelter_snapshot. Returns its manifest, or None on failure.
+        from snapshot import DEFAULT_SNAPSHOT, collection_columns, write_snapshot
+
+        path = path or os.getenv('SHELTER_SNAPSHOT', DEFAULT_SNAPSHOT)
+        with self._metrics.timer('export_snapshot') as timer:
+            try:
+                columns, watermark = collection_columns(self.collection, batch_size=batch_size)
+                manifest = write_snapshot(columns, path, watermark)
+                timer.documents = manifest['rows']
+                self._log.info("Exported %d documents to snapshot %s", manifest['rows'], path,
+                               extra={'rows': manifest['rows'], 'path': path})
+                return manifest
+            except Exception as e:
+                timer.error = True
+                self._log.error("Error exporting snapshot to %s: %s", path, e)
+                return None
+
+    def open_snapshot(self, path=None, catch_up=True):
+        # Read-only MemoryShelter over a snapshot written by export_snapshot: the columns are
+        # memory-mapped (shared by every process using the same path) and, with catch_up,
+        # extended with the documents inserted since the snapshot's watermark
+        from memory_backend import MemoryShelter
+        from snapshot import DEFAULT_SNAPSHOT
+
+        return MemoryShelter(source=path or os.getenv('SHELTER_SNAPSHOT', DEFAULT_SNAPSHOT), shelter=self,
+                             catch_up=catch_up)
+
+    def find_page(self, criteria=None, page=0, page_size=DEFAULT_PAGE_SIZE, sort=None, projection=None):
+        # Offset pagination for UIs that jump straight to page N (e.g. the dashboard table).
+        # Returns (docs, total) where total is the number of documents matching criteria,
+        # so only one page ever crosses the wire. `sort` is a list of (field, direction) pairs.
+        if page_size <= 0:
+            raise ValueError("Page size must be greater than zero.")
+
+        def fetch():
+            cursor = self.collection.find(criteria or {}, projection if projection is not None else DEFAULT_PROJECTION)
+            if sort:
+                cursor = cursor.sort(list(sort))
+            return list(cursor.skip(max(page, 0) * page_size).limit(page_size))
+
+        with self._metrics.timer('find_page') as timer:
+            try:
+                docs = timer.count(self._cached(('find_page', criteria, page, page_size, sort, projection), fetch))
+                total = self.count_records(criteria)
+                return docs, total
+            except Exception as e:
+                timer.error = True
+                self._log.error("Error retrieving page %s: %s", page, e, extra={'criteria': criteria})
+                return [], 0
+
+    def _geo_query(self, criteria, bounds):
+        # criteria restricted to documents with a location inside the viewport
+        polygon = viewport_polygon(bounds) if bounds else None
+        if polygon:
+            clause = {'location': {'$geoWithin': {'$geometry': polygon}}}
+        else:
+            clause = {'location': {'$exists': True}}
+        return {'$and': [criteria, clause]} if criteria else clause
+
+    def find_within_bounds(self, criteria=None, bounds=None, projection=None, limit=0):
+        # Documents matching criteria whose location lies inside the map viewport
+        # ([[south, west], [north, east]]), answered from the 2dsphere index
+        query = self._geo_query(criteria, bounds)
+        with self._metrics.timer('find_within_bounds') as timer:
+            try:
+                return timer.count(self._cached(('find_within_bounds', query, projection, limit),
+                                                lambda: list(self._find(query, projection, limit))))
+            except Exception as e:
+                timer.error = True
+                self._log.error("Error retrieving documents in viewport: %s", e, extra={'criteria': criteria})
+                return []
+
+    def get_clusters(self, criteria=None, bounds=None, zoom=10, max_clusters=MAX_CLUSTERS):
+        # Grid clustering for the map, done in the database: animals inside the viewport are
+        # grouped into cells sized for the zoom level, so the browser receives one point per
+        # cell however many animals match. Returns [{'lat', 'long', 'count'}, ...] (centroids,
+        # largest first); single-animal cells also carry animal_id, name and breed.
+        pipeline = [{'$match': self._geo_query(criteria, bounds)}] + self._cluster_stages(zoom, max_clusters)
+        with self._metrics.timer('get_clusters', zoom=int(zoom)) as timer:
+            try:
+                groups = self._cached(('get_clusters', pipeline), lambda: list(self.collection.aggregate(pipeline)))
+            except Exception as e:
+                timer.error = True
+                self._log.error("Error clustering locations: %s", e, extra={'criteria': criteria})
+                return []
+            clusters = self._clusters(groups)
+            timer.documents = len(clusters)
+            return clusters
+
+    @staticmethod
+    def _cluster_stages(zoom, max_clusters):
+        # $group/$sort/$limit stages behind get_clusters, for located documents
+        cell = cluster_cell_degrees(zoom)
+        lat = {'$arrayElemAt': ['$location.coordinates', 1]}
+        long = {'$arrayElemAt': ['$location.coordinates', 0]}
+        return [
+            {'$group': {
+                '_id': {'lat': {'$floor': {'$divide': [lat, cell]}}, 'long': {'$floor': {'$divide': [long, cell]}}},
+                'count': {'$sum': 1},
+                'lat': {'$avg': lat},
+                'long': {'$avg': long},
+                'animal_id': {'$first': '$animal_id'},
+                'name': {'$first': '$name'},
+                'breed': {'$first': '$breed'},
+            }},
+            {'$sort': {'count': -1}},
+            {'$limit': max_clusters},
+        ]
+
+    @staticmethod
+    def _clusters(groups):
+        # Cluster groups as returned by get_clusters
+        clusters = []
+        for group in groups:
+            cluster = {'lat': group['lat'], 'long': group['long'], 'count': group['count']}
+            if group['count'] == 1:
+                cluster.update(animal_id=group.get('animal_id'), name=group.get('name'), breed=group.get('breed'))
+            clusters.append(cluster)
+        return clusters
+
+    def dashboard_view(self, filter_type, page=0, page_size=DEFAULT_PAGE_SIZE, criteria=None, sort=None,
+                       bounds=None, zoom=10, top_k=DEFAULT_TOP_K, other_label='Other', max_clusters=MAX_CLUSTERS):
+        # Everything the dashboard shows for a rescue type in one round trip: a $facet
+        # aggregation over the matching documents returns the table page, the total, the
+        # breed counts (top_k plus an `other_label` bucket) and the map clusters for the
+        # viewport. `criteria` narrows the rescue filter further (the table's column filters)
+        # and `sort` is a list of (field, direction) pairs. A rescue type shown without table
+        # filters takes its total and breed counts from the precomputed rescue summaries (one
+        # find), so the aggregation only has to page and cluster; both reads share one cache entry.
+        # Returns {'records', 'total', 'breed_counts', 'clusters'}.
+        if page_size <= 0:
+            raise ValueError("Page size must be greater than zero.")
+
+        rescue = RESCUE_FILTERS.get(filter_type, {})
+        match = {'$and': [rescue, criteria]} if rescue and criteria else (rescue or criteria or {})
+        facets = {
+            'records': ([{'$sort': dict(sort)}] if sort else []) + [
+                {'$skip': max(page, 0) * page_size}, {'$limit': page_size}, {'$project': DEFAULT_PROJECTION}],
+            'clusters': [{'$match': self._geo_query(None, bounds)}] + self._cluster_stages(zoom, max_clusters),
+        }
+        breeds = [{'$group': {'_id': '$breed', 'count': {'$sum': 1}}}, {'$sort': {'count': -1, '_id': 1}}]
+        counted = dict(facets, total=[{'$count': 'count'}], breeds=breeds + ([{'$limit': top_k}] if top_k else []))
+
+        def fetch():
+            summary = self._summary_view(filter_type) if rescue and not criteria else None
+            pipeline = [{'$match': match}, {'$facet': counted if summary is None else facets}]
+            return summary, list(self.collection.aggregate(pipeline))
+
+        with self._metrics.timer('dashboard_view', filter=filter_type) as timer:
+            try:
+                # Keyed on the inputs rather than the pipeline: make_key sorts dict keys, which
+                # would give a multi-column $sort and its reordering the same entry
+                key = ('dashboard_view', match, page, page_size, [list(pair) for pair in sort or []], bounds, zoom,
+                       top_k, max_clusters)
+                summary, result = self._cached(key, fetch)
+            except Exception as e:
+                timer.error = True
+                self._log.error("Error building dashboard view: %s", e, extra={'criteria': match})
+                return {'records': [], 'total': 0, 'breed_counts': [], 'clusters': []}
+            facets = result[0] if result else {}
+            if summary is not None:
+                total = sum(count for _, count in summary['total'])
+                breed_counts = self._fold_tail(summary['breed'], top_k, other_label)
             else:
-                print("Finding all documents")
-                cursor = self.collection.find({}, {'_id': 0})
+                total = facets['total'][0]['count'] if facets.get('total') else 0
+                breed_counts = [(doc['_id'], doc['count']) for doc in facets.get('breeds', [])]
+                other = total - sum(count for _, count in breed_counts)
+                if top_k and other > 0:
+                    breed_counts.append((other_label, other))
+            records = timer.count(facets.get('records', []))
+            return {'records': records, 'total': total, 'breed_counts': breed_counts,
+                    'clusters': self._clusters(facets.get('clusters', []))}
 
-            docs = list(cursor)
-            print(f"Found {len(docs)} documents.")
-            return docs
-        except Exception as e:
-            print(f"Error retrieving documents: {e}")
-            return []
+    def count_records(self, criteria=None):
+        # Count documents matching criteria without fetching them
+        with self._metrics.timer('count_records') as timer:
+            try:
+                return self._cached(('count_records', criteria), lambda: self.collection.count_documents(criteria or {}))
+            except Exception as e:
+                timer.error = True
+                self._log.error("Error counting documents: %s", e, extra={'criteria': criteria})
+                return 0
+
+    def get_category_counts(self, criteria=None, field='breed', top_k=DEFAULT_TOP_K, other_label='Other'):
+        # Count documents per value of a categorical field with a $group aggregation, so
+        # only the counts leave the server. Returns [(value, count), ...] sorted by count;
+        # values past the top_k most common are folded into a single `other_label` bucket.
+        pipeline = self._category_pipeline(criteria, field, top_k)
+        with self._metrics.timer('get_category_counts', field=field) as timer:
+            try:
+                result = self._cached(('get_category_counts', pipeline),
+                                      lambda: list(self.collection.aggregate(pipeline)))
+            except Exception as e:
+                timer.error = True
+                self._log.error("Error counting %s values: %s", field, e, extra={'criteria': criteria})
+                return []
+            counts = self._fold_counts(result, top_k, other_label)
+            timer.documents = len(counts)
+            return counts
+
+    @staticmethod
+    def _category_pipeline(criteria, field, top_k):
+        # $group pipeline behind get_category_counts
+        pipeline = []
+        if criteria:
+            pipeline.append({'$match': criteria})
+        pipeline += [
+            {'$group': {'_id': f'${field}', 'count': {'$sum': 1}}},
+            {'$sort': {'count': -1, '_id': 1}},
+        ]
+        if top_k:
+            pipeline.append({'$facet': {
+                'top': [{'$limit': top_k}],
+                'other': [{'$skip': top_k}, {'$group': {'_id': None, 'count': {'$sum': '$count'}}}],
+            }})
+        return pipeline
+
+    @staticmethod
+    def _fold_counts(result, top_k, other_label):
+        # Turn the aggregation output into [(value, count), ...] plus the "Other" bucket
+        if not top_k:
+            return [(doc['_id'], doc['count']) for doc in result]
+        facets = result[0] if result else {'top': [], 'other': []}
+        counts = [(doc['_id'], doc['count']) for doc in facets['top']]
+        if facets['other'] and facets['other'][0]['count']:
+            counts.append((other_label, facets['other'][0]['count']))
+        return counts
+
+    def _cached(self, key_parts, fetch):
+        # Serve a read from the query cache when enabled. Cached results are shared
+        # between callers, so treat them as read-only. Errors are never cached.
+        # Misses run through the connection manager so dropped connections are retried.
+        if self._cache is None:
+            return self._connection.run(fetch)
+        key = self._cache.make_key(*key_parts)
+        hit, value = self._cache.get(key)
+        if hit:
+            return value
+        value = self._connection.run(fetch)
+        self._cache.set(key, value)
+        return value
+
+    def _invalidate_cache(self):
+        # Any write may change any cached result, so drop them all
+        if self._cache is not None:
+            self._cache.clear()
+
+    def _find(self, criteria=None, projection=None, limit=0, batch_size=None):
+        # Build the cursor shared by get_records/iter_records
+        cursor = self.collection.find(criteria or {}, projection if projection is not None else DEFAULT_PROJECTION)
+        if limit:
+            cursor = cursor.limit(limit)
+        if batch_size:
+            cursor = cursor.batch_size(batch_size)
+        return cursor
+
+    @classmethod
+    def _keyset_query(cls, criteria, after, sort_key):
+        # Query and sort for the keyset page following `after`
+        query = dict(criteria) if criteria else {}
+        if after is not None:
+            condition = cls._keyset_condition(sort_key, after)
+            query = {'$and': [query, condition]} if query else condition
+
+        sort = [(sort_key, ASCENDING)]
+        if sort_key != '_id':
+            sort.append(('_id', ASCENDING))  # tie-break so equal sort values never repeat or skip
+        return query, sort
+
+    @staticmethod
+    def _finish_page(docs, page_size, sort_key, strip):
+        # Compute the next page token and drop fields fetched only to build it
+        next_after = None
+        if len(docs) == page_size:
+            last = docs[-1]
+            next_after = last['_id'] if sort_key == '_id' else (last.get(sort_key), last['_id'])
+        for doc in docs:
+            for field in strip:
+                doc.pop(field, None)
+        return docs, next_after
+
+    @staticmethod
+    def _keyset_condition(sort_key, after):
+        # Range condition selecting everything after the previous page's last (sort key, _id)
+        if sort_key == '_id':
+            return {'_id': {'$gt': after}}
+        value, last_id = after
+        # Missing and null values sort first, but $gt only compares values of the same type,
+        # so after a null page "greater" means any non-null value
+        greater = {'$exists': True, '$ne': None} if value is None else {'$gt': value}
+        return {'$or': [
+            {sort_key: greater},
+            {sort_key: value, '_id': {'$gt': last_id}},
+        ]}
+
+    @staticmethod
+    def _keyset_projection(projection, sort_key):
+        # The page token needs the sort key and _id, so make sure both are fetched and
+        # remember which ones to strip again before handing documents back
+        fields = dict(projection if projection is not None else DEFAULT_PROJECTION)
+        strip = []
+        inclusive = any(v for k, v in fields.items() if k != '_id')
+        for key in {'_id', sort_key}:
+            if key == '_id' or not inclusive:
+                if key in fields and not fields[key]:
+                    del fields[key]
+                    strip.append(key)
+            elif key not in fields:
+                fields[key] = 1
+                strip.append(key)
+        return fields or None, strip
 
     def update_record(self, query, new_value):
         # Make sure query and new data are provided before updating
@@ -94,33 +796,386 @@ class AnimalShelter:
             raise ValueError("No search criteria is present.")
         if not new_value:
             raise ValueError("No update value is present.")
+        update, refresh = self._derived_update({'$set': new_value})  # raises ValueError for bad types
 
-        try:
-            # Perform bulk update and track matched/modified counts
-            result = self.collection.update_many(query, {"$set": new_value})
-            self._records_updated = result.modified_count
-            self._records_matched = result.matched_count
-            print(f"Update: matched {self._records_matched}, modified {self._records_updated}")
-            return result.modified_count > 0
-        except Exception as e:
-            print(f"Error updating documents: {e}")
-            return False
+        with self._metrics.timer('update_record') as timer:
+            try:
+                # Perform bulk update and track matched/modified counts
+                before = self._summary_inputs(query)
+                # The query may stop matching once the update is applied, so note the targets first
+                ids = self._matching_ids(query, before) if refresh else None
+                result = self.collection.update_many(query, update)
+                if ids:
+                    self._refresh_locations({'_id': {'$in': ids}})
+                self._invalidate_cache()
+                if before:
+                    self._update_summaries(before, self._summary_inputs({'_id': {'$in': [d['_id'] for d in before]}}))
+                self._records_updated = result.modified_count
+                self._records_matched = result.matched_count
+                timer.documents = result.modified_count
+                self._log.info("Update: matched %d, modified %d", self._records_matched, self._records_updated,
+                               extra={'matched': self._records_matched, 'modified': self._records_updated})
+                return result.modified_count > 0
+            except Exception as e:
+                timer.error = True
+                self._log.error("Error updating documents: %s", e)
+                return False
 
     def delete_record(self, query):
         # Check query before attempting delete operation
         if not query:
             raise ValueError("No search criteria is present.")
 
+        with self._metrics.timer('delete_record') as timer:
+            try:
+                # Delete matching documents and track how many were removed
+                before = self._summary_inputs(query)
+                result = self.collection.delete_many(query)
+                self._invalidate_cache()
+                if before:
+                    self._update_summaries(before, [])
+                self._records_deleted = result.deleted_count
+                timer.documents = result.deleted_count
+                self._log.info("Deleted %d documents", self._records_deleted, extra={'deleted': self._records_deleted})
+                return result.deleted_count > 0
+            except Exception as e:
+                timer.error = True
+                self._log.error("Error deleting documents: %s", e)
+                return False
+
+    def apply_changes(self, changes, batch_size=DEFAULT_BATCH_SIZE, ordered=False):
+        # Apply many (query, change) pairs with bulk_write, batch_size operations per round
+        # trip. `change` is an update document ($set, $inc, $unset, $push, ...; a plain dict
+        # means $set, as in update_record) applied to every match, or None to delete the
+        # matches. Unordered mode keeps going past failed operations; ordered mode stops at
+        # the first. Returns {'matched', 'modified', 'deleted', 'errors', 'batches'}, where
+        # errors carry the index of the failed pair and batches holds each round trip's
+        # counts (bulk_write reports counts per round trip, not per operation).
+        summary = {'matched': 0, 'modified': 0, 'deleted': 0, 'errors': [], 'batches': []}
+        for offset, batch in iter_batches(changes, batch_size):
+            requests, positions, queries, refreshed, invalid = [], [], [], [], False
+            for index, (query, change) in enumerate(batch, offset):
+                try:
+                    request, refresh = self._change_request(query, change)
+                except ValueError as e:
+                    summary['errors'].append({'index': index, 'errmsg': str(e)})
+                    invalid = True
+                    if ordered:
+                        break
+                    continue
+                requests.append(request)
+                positions.append(index)
+                queries.append(query)
+                if refresh:
+                    refreshed.append(query)
+
+            counts = {'start': offset, 'operations': len(requests), 'matched': 0, 'modified': 0, 'deleted': 0}
+            with self._metrics.timer('apply_changes') as timer:
+                before = self._summary_inputs({'$or': queries}) if requests else None
+                ids = self._matching_ids({'$or': refreshed}) if refreshed else None
+                try:
+                    if requests:
+                        result = self.collection.bulk_write(requests, ordered=ordered)
+                        counts.update(matched=result.matched_count, modified=result.modified_count,
+                                      deleted=result.deleted_count)
+                except BulkWriteError as e:
+                    counts.update(matched=e.details.get('nMatched', 0), modified=e.details.get('nModified', 0),
+                                  deleted=e.details.get('nRemoved', 0))
+                    summary['errors'] += self._write_errors(e, positions)
+                    timer.error = invalid = True
+                except Exception as e:
+                    self._log.error("Error applying changes: %s", e)
+                    summary['errors'].append({'index': offset, 'errmsg': str(e)})
+                    timer.error = invalid = True
+                finally:
+                    if ids:
+                        self._refresh_locations({'_id': {'$in': ids}})
+                    if before:
+                        ids = {'_id': {'$in': [doc['_id'] for doc in before]}}
+                        self._update_summaries(before, self._summary_inputs(ids))
+                timer.documents = counts['modified'] + counts['deleted']
+            for field in ('matched', 'modified', 'deleted'):
+                summary[field] += counts[field]
+            summary['batches'].append(counts)
+            if invalid and ordered:
+                break
+
+        summary['errors'].sort(key=lambda error: error['index'])
+        self._invalidate_cache()
+        # The counters describe the whole call, not just its last batch
+        self._records_matched = summary['matched']
+        self._records_updated = summary['modified']
+        self._records_deleted = summary['deleted']
+        self._log.info("Applied changes: matched %d, modified %d, deleted %d (%d errors)",
+                       summary['matched'], summary['modified'], summary['deleted'], len(summary['errors']),
+                       extra={'matched': summary['matched'], 'modified': summary['modified'],
+                              'deleted': summary['deleted'], 'errors': len(summary['errors'])})
+        return summary
+
+    @classmethod
+    def _change_request(cls, query, change):
+        # (UpdateMany/DeleteMany, refresh) for one apply_changes pair, where refresh is
+        # _derived_update's flag; raises ValueError for bad input
+        if not query:
+            raise ValueError("No search criteria is present.")
+        if change is None:
+            return DeleteMany(query), False
+        if not change:
+            raise ValueError("No update value is present.")
+        if not any(key.startswith('$') for key in change):
+            change = {'$set': change}
+        elif not all(key.startswith('$') for key in change):
+            raise ValueError("Update mixes operators and plain fields.")
+
+        for operator, fields in change.items():
+            touched = [field for field in DERIVED_INPUTS if field in fields]
+            if operator not in ('$set', '$unset') and touched:
+                raise ValueError(f"{', '.join(touched)} can only be changed with $set or $unset.")
+        update, refresh = cls._derived_update(change)
+        return UpdateMany(query, update), refresh
+
+    @classmethod
+    def _derived_update(cls, update, partial=True):
+        # Copy of an update document with the derived fields its $set and $unset imply, plus
+        # whether location must be recomputed after the write (_refresh_locations): a $set
+        # of one coordinate can't tell what the other one is stored as. Coordinates that are
+        # $set together but don't form a valid point unset location.
+        update = dict(update)
+        fields = update['$set'] = cls._with_derived_fields(update.get('$set', {}), partial=partial)
+        if not fields:
+            del update['$set']
+        unset = dict(update.get('$unset', {}))
+        if 'breed' in unset:
+            unset['rescue_categories'] = ''
+        coordinates = [field for field in LOCATION_INPUTS if field in fields]
+        if 'location' not in fields and (len(coordinates) == 2 or any(field in unset for field in LOCATION_INPUTS)):
+            unset['location'] = ''
+        if unset:
+            update['$unset'] = unset
+        return update, len(coordinates) == 1 and 'location' not in unset
+
+    @staticmethod
+    def _location_requests(docs):
+        # UpdateOne per document setting location from its stored coordinates, or unsetting
+        # it when they aren't a valid point
+        requests = []
+        for doc in docs:
+            point = location_point(doc.get('location_lat'), doc.get('location_long'))
+            change = {'$set': {'location': point}} if point else {'$unset': {'location': ''}}
+            requests.append(UpdateOne({'_id': doc['_id']}, change))
+        return requests
+
+    def _refresh_locations(self, query):
+        # Recompute location on the documents matching query, after a write that $set one
+        # coordinate. Like the summaries, a failure here doesn't fail the write; the next
+        # backfill_derived_fields() puts it right.
         try:
-            # Delete matching documents and track how many were removed
-            result = self.collection.delete_many(query)
-            self._records_deleted = result.deleted_count
-            print(f"Deleted {self._records_deleted} documents.")
-            return result.deleted_count > 0
+            docs = self.collection.find(query, {'location_lat': 1, 'location_long': 1})
+            requests = self._location_requests(docs)
+            if requests:
+                self.collection.bulk_write(requests, ordered=False)
         except Exception as e:
-            print(f"Error deleting documents: {e}")
+            self._log.error("Error recomputing locations (run backfill_derived_fields): %s", e)
+
+    def _matching_ids(self, query, docs=None):
+        # _ids of the documents matching query, reusing docs already read for it
+        if docs is None:
+            docs = self.collection.find(query, {'_id': 1})
+        return [doc['_id'] for doc in docs]
+
+    def backfill_derived_fields(self, batch_size=1000):
+        # Recompute derived fields (rescue_categories, location) for every document, e.g. after
+        # loading data outside this class or changing a rescue profile's breeds.
+        # Returns the number of documents modified.
+        modified = 0
+        batch = []
+        try:
+            inputs = {'breed': 1, 'location_lat': 1, 'location_long': 1}
+            for doc in self.collection.find({}, inputs).batch_size(batch_size):
+                doc_id = doc.pop('_id')
+                derived = self._with_derived_fields(doc, validate=False)
+                change = {'$set': {'rescue_categories': derived['rescue_categories']}}
+                if derived.get('location'):
+                    change['$set']['location'] = derived['location']
+                else:
+                    change['$unset'] = {'location': ''}
+                batch.append(UpdateOne({'_id': doc_id}, change))
+                if len(batch) >= batch_size:
+                    modified += self.collection.bulk_write(batch, ordered=False).modified_count
+                    batch = []
+            if batch:
+                modified += self.collection.bulk_write(batch, ordered=False).modified_count
+            self._log.info("Backfilled derived fields on %d documents", modified)
+            self.ensure_indexes()
+            if self._maintain_summaries:
+                self.rebuild_summaries()
+        except Exception as e:
+            self._log.error("Error backfilling derived fields: %s", e)
+        finally:
+            self._invalidate_cache()
+        return modified
+
+    def _summary_inputs(self, query):
+        # Documents a write is about to touch (summary fields only), or None when
+        # summaries aren't maintained
+        if not self._maintain_summaries:
+            return None
+        try:
+            return self.summaries.fetch(query)
+        except Exception as e:
+            self._log.error("Error reading documents for rescue summaries (run rebuild_summaries): %s", e)
+            return None
+
+    def _update_summaries(self, before, after):
+        # Fold a completed write into the rescue summaries. A failure here never fails
+        # the write itself; the summaries just need a rebuild_summaries() afterwards.
+        if not self._maintain_summaries or not (before or after):
+            return
+        try:
+            self.summaries.apply(before or [], after or [])
+        except Exception as e:
+            self._log.error("Error updating rescue summaries (run rebuild_summaries): %s", e)
+
+    def rebuild_summaries(self, names=None):
+        # Recompute the rescue summaries from the animals collection with $merge
+        with self._metrics.timer('rebuild_summaries'):
+            try:
+                self.summaries.rebuild(names)
+                return True
+            except Exception as e:
+                self._log.error("Error rebuilding rescue summaries: %s", e)
+                return False
+
+    def get_summary(self, rescue_type):
+        # Precomputed summary for a rescue type (see summaries.RescueSummaries.get), or None
+        with self._metrics.timer('get_summary', rescue=rescue_type):
+            try:
+                return self.summaries.get(rescue_type)
+            except Exception as e:
+                self._log.error("Error reading %s summary: %s", rescue_type, e)
+                return None
+
+    def get_summary_counts(self, rescue_type, dim='breed', top_k=DEFAULT_TOP_K, other_label='Other'):
+        # get_category_counts served from the precomputed summary: [(value, count), ...]
+        # with the long tail folded into `other_label`. None if the summary isn't built.
+        with self._metrics.timer('get_summary_counts', rescue=rescue_type, dim=dim) as timer:
+            try:
+                counts = self.summaries.get_counts(rescue_type, dim)
+            except Exception as e:
+                timer.error = True
+                self._log.error("Error reading %s summary: %s", rescue_type, e)
+                return None
+            if counts is None:
+                return None
+            counts = self._fold_tail(counts, top_k, other_label)
+            timer.documents = len(counts)
+            return counts
+
+    @staticmethod
+    def _fold_tail(counts, top_k, other_label):
+        # Fold the counts past the top_k most common into one `other_label` bucket
+        if top_k and len(counts) > top_k:
+            return counts[:top_k] + [(other_label, sum(count for _, count in counts[top_k:]))]
+        return counts
+
+    def _summary_view(self, rescue_type):
+        # {'total': [...], 'breed': [...]} counts from the rescue summaries in one find, or
+        # None when this process doesn't keep them current (SHELTER_SUMMARIES=0), they
+        # haven't been built or they can't be read
+        if not self._maintain_summaries:
+            return None
+        try:
+            return self.summaries.get_dims(rescue_type, ['total', 'breed'])
+        except Exception as e:
+            self._log.error("Error reading %s summary: %s", rescue_type, e)
+            return None
+
+    @staticmethod
+    def _with_derived_fields(data, partial=False, validate=True):
+        # Return a copy of data, with AAC fields converted to their declared types (see
+        # models.validate_fields, which raises ValueError), plus fields computed from it.
+        # For partial documents ($set payloads) only fields whose inputs are present are touched.
+        derived = validate_fields(data, partial) if validate else dict(data)
+        if not partial or 'breed' in data:
+            derived['rescue_categories'] = rescue_categories_for(data.get('breed'))
+        if 'location_lat' in derived and 'location_long' in derived:
+            point = location_point(derived['location_lat'], derived['location_long'])
+            if point:
+                derived['location'] = point
+        return derived
+
+    def ensure_indexes(self, specs=None):
+        # Create every index in INDEX_SPECS (or the given specs); existing ones are left alone.
+        # Returns the names of the indexes ensured.
+        names = []
+        for spec in specs or INDEX_SPECS:
+            try:
+                options = {k: v for k, v in spec.items() if k != 'keys'}
+                names.append(self.collection.create_index(spec['keys'], **options))
+            except Exception as e:
+                self._log.error("Error creating index %s: %s", spec.get('name', spec['keys']), e)
+        self._log.info("Ensured indexes: %s", ', '.join(names))
+        return names
+
+    def apply_schema(self, level='moderate', action='error'):
+        # Install models.ANIMAL_JSON_SCHEMA as the collection's validator, so writes that
+        # bypass this class are checked too. 'moderate' leaves existing invalid documents
+        # alone until they're updated. Returns True on success.
+        validator = {'$jsonSchema': ANIMAL_JSON_SCHEMA}
+        try:
+            if self._connection.settings['col_name'] in self.database.list_collection_names():
+                self.database.command('collMod', self.collection.name, validator=validator,
+                                      validationLevel=level, validationAction=action)
+            else:
+                self.database.create_collection(self.collection.name, validator=validator,
+                                                validationLevel=level, validationAction=action)
+            self._log.info("Applied animal schema (%s/%s)", level, action)
+            return True
+        except Exception as e:
+            self._log.error("Error applying animal schema: %s", e)
             return False
 
+    def explain_queries(self, queries):
+        # Run explain() for each named query and report how much work the server did.
+        # `queries` maps a label to criteria; the report maps the label to docs/keys
+        # examined vs returned, the indexes used and whether it fell back to a COLLSCAN.
+        report = {}
+        for label, criteria in queries.items():
+            try:
+                explained = self.collection.find(criteria or {}).explain()
+            except Exception as e:
+                self._log.error("Error explaining query %s: %s", label, e)
+                continue
+            stats = explained.get('executionStats', {})
+            plan = explained.get('queryPlanner', {}).get('winningPlan', {})
+            stages, indexes = self._plan_stages(plan.get('queryPlan', plan))
+            report[label] = {
+                'docs_examined': stats.get('totalDocsExamined'),
+                'keys_examined': stats.get('totalKeysExamined'),
+                'returned': stats.get('nReturned'),
+                'time_ms': stats.get('executionTimeMillis'),
+                'stages': stages,
+                'indexes': indexes,
+                'collection_scan': 'COLLSCAN' in stages,
+            }
+        return report
+
+    @staticmethod
+    def _plan_stages(plan):
+        # Flatten a winning plan tree into its stage names and the index names it uses
+        stages, indexes = [], []
+        pending = [plan]
+        while pending:
+            node = pending.pop()
+            if 'stage' in node:
+                stages.append(node['stage'])
+            if 'indexName' in node:
+                indexes.append(node['indexName'])
+            if 'inputStage' in node:
+                pending.append(node['inputStage'])
+            pending.extend(node.get('inputStages', []))
+        return stages, indexes
+
     # Properties to safely access operation counters
     @property
     def records_updated(self):
@@ -134,11 +1189,38 @@ class AnimalShelter:
     def records_deleted(self):
         return self._records_deleted
 
+    @property
+    def cache_hits(self):
+        return self._cache.hits if self._cache is not None else 0
+
+    @property
+    def cache_misses(self):
+        return self._cache.misses if self._cache is not None else 0
+
 
 # If I run crud.py by itself, this block runs some basic tests and prints results
+# `python crud.py backfill` recomputes derived fields for existing documents and
+# `python crud.py indexes` creates the indexes in INDEX_SPECS
+# `python crud.py summaries` rebuilds the rescue summaries
+# `python crud.py schema` installs the $jsonSchema validator from models.py
+# `python crud.py snapshot [path]` exports the collection for SHELTER_BACKEND=memory
 if __name__ == "__main__":
+    configure_logging('INFO')
     shelter = AnimalShelter()
 
+    if sys.argv[1:] == ['backfill']:
+        shelter.backfill_derived_fields()
+        sys.exit(0)
+    if sys.argv[1:] == ['indexes']:
+        shelter.ensure_indexes()
+        sys.exit(0)
+    if sys.argv[1:] == ['summaries']:
+        sys.exit(0 if shelter.rebuild_summaries() else 1)
+    if sys.argv[1:] == ['schema']:
+        sys.exit(0 if shelter.apply_schema() else 1)
+    if sys.argv[1:2] == ['snapshot']:
+        sys.exit(0 if shelter.export_snapshot(sys.argv[2] if len(sys.argv) > 2 else None) else 1)
+
     print("Testing: create_record")
     shelter.create_record({"name": "Test Dog", "breed": "Labrador", "age_upon_outcome": "2 years"})
 
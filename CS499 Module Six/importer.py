@@ -0,0 +1,105 @@
+# importer.py
+import argparse
+import csv
+import json
+import time
+
+from crud import AnimalShelter, DEFAULT_BATCH_SIZE, iter_batches
+
+# AAC outcome columns that arrive as text but are stored as numbers
+NUMERIC_FIELDS = {
+    'age_upon_outcome_in_weeks': float,
+    'location_lat': float,
+    'location_long': float,
+}
+
+
+def coerce_record(row):
+    # Clean one raw record: drop the unnamed index column pandas exports write,
+    # drop empty values and convert numeric columns. Unparseable numbers are dropped
+    # rather than stored as strings so range queries on them keep working.
+    record = {}
+    for key, value in row.items():
+        if not key or value is None or value == '':
+            continue
+        if key in NUMERIC_FIELDS and isinstance(value, str):
+            try:
+                value = NUMERIC_FIELDS[key](value)
+            except ValueError:
+                continue
+        record[key] = value
+    return record
+
+
+def iter_csv_records(path):
+    # Stream rows from a CSV file one at a time; the file is never read whole
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            yield coerce_record(row)
+
+
+def iter_jsonl_records(path):
+    # Stream records from a JSON-lines file, skipping blank lines
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield coerce_record(json.loads(line))
+
+
+def iter_file_records(path):
+    # Pick a reader from the file extension
+    if path.lower().endswith(('.jsonl', '.ndjson', '.json')):
+        return iter_jsonl_records(path)
+    return iter_csv_records(path)
+
+
+def import_file(shelter, path, batch_size=DEFAULT_BATCH_SIZE, upsert_key=None, ordered=False):
+    """
+    Load a CSV or JSON-lines file into the collection batch by batch, printing
+    throughput and errors for each batch. With upsert_key set, records are
+    upserted on that field instead of inserted. Returns the overall totals.
+    """
+    totals = {'records': 0, 'written': 0, 'errors': 0, 'seconds': 0.0}
+    for number, (offset, batch) in enumerate(iter_batches(iter_file_records(path), batch_size), 1):
+        started = time.perf_counter()
+        if upsert_key:
+            result = shelter.upsert_records(batch, key=upsert_key, batch_size=batch_size, ordered=ordered)
+            written = result['upserted'] + result['modified']
+        else:
+            result = shelter.create_records(batch, batch_size=batch_size, ordered=ordered)
+            written = result['inserted']
+        elapsed = time.perf_counter() - started
+
+        totals['records'] += len(batch)
+        totals['written'] += written
+        totals['errors'] += len(result['errors'])
+        totals['seconds'] += elapsed
+        rate = len(batch) / elapsed if elapsed else float('inf')
+        print(f"Batch {number}: {len(batch)} records, {written} written in {elapsed:.2f}s "
+              f"({rate:,.0f} records/s), {len(result['errors'])} errors")
+        for error in result['errors'][:5]:
+            print(f"  record {offset + error['index']}: {error['errmsg']}")
+        if ordered and result['errors']:
+            print("Stopping at first failed batch (ordered mode).")
+            break
+
+    rate = totals['records'] / totals['seconds'] if totals['seconds'] else 0
+    print(f"Imported {totals['written']} of {totals['records']} records in {totals['seconds']:.2f}s "
+          f"({rate:,.0f} records/s), {totals['errors']} errors")
+    return totals
+
+
+# e.g. `python importer.py aac_shelter_outcomes.csv --upsert-key rec_num`
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream AAC outcome data into MongoDB.")
+    parser.add_argument('path', help="CSV or JSON-lines file")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--upsert-key', help="field to upsert on instead of inserting; must be unique per "
+                                             "row, e.g. rec_num (animal_id repeats across outcomes)")
+    parser.add_argument('--ordered', action='store_true', help="stop at the first failed write")
+    args = parser.parse_args()
+
+    shelter = AnimalShelter()
+    import_file(shelter, args.path, args.batch_size, args.upsert_key, args.ordered)
+    shelter.ensure_indexes()
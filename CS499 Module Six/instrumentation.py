@@ -0,0 +1,198 @@
+# instrumentation.py
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from bson import BSON
+
+# Latency bucket bounds in seconds for the Prometheus histogram
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Standard LogRecord attributes; anything else on a record came from `extra=`
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    # One JSON object per line: time, level, logger, message plus any `extra` fields
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in _RECORD_FIELDS})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level=None, fmt=None):
+    # Set up the 'shelter' loggers from SHELTER_LOG_LEVEL (default WARNING) and
+    # SHELTER_LOG_FORMAT ('json' or 'text'). Safe to call more than once.
+    level = (level or os.getenv('SHELTER_LOG_LEVEL', 'WARNING')).upper()
+    fmt = fmt or os.getenv('SHELTER_LOG_FORMAT', 'text')
+
+    logger = logging.getLogger('shelter')
+    logger.setLevel(level)
+    if not any(getattr(h, '_shelter_handler', False) for h in logger.handlers):
+        handler = logging.StreamHandler()
+        handler._shelter_handler = True
+        logger.addHandler(handler)
+    for handler in logger.handlers:
+        if getattr(handler, '_shelter_handler', False):
+            handler.setFormatter(JsonFormatter() if fmt == 'json'
+                                 else logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    return logger
+
+
+class LatencyHistogram:
+    # Per-operation latency distribution: cumulative buckets for Prometheus, a bounded
+    # sample of recent latencies for p50/p95/p99, and document/byte totals.
+
+    def __init__(self, sample_size=2048):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.documents = 0
+        self.bytes = 0
+        self.errors = 0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self._recent = deque(maxlen=sample_size)
+
+    def observe(self, seconds, documents=0, size=0, error=False):
+        self.count += 1
+        self.total_seconds += seconds
+        self.documents += documents
+        self.bytes += size
+        self.errors += bool(error)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+        self._recent.append(seconds)
+
+    def quantiles(self):
+        # {0.5: seconds, 0.95: ..., 0.99: ...} over the recent sample
+        if not self._recent:
+            return {q: 0.0 for q in QUANTILES}
+        ordered = sorted(self._recent)
+        return {q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in QUANTILES}
+
+
+class Timer:
+    # Returned by MetricsRegistry.timer(); set .documents / .bytes inside the block,
+    # or call .count(docs) to record both from a result list. Set .error when the
+    # operation failed but the exception was handled inside the block.
+
+    def __init__(self, registry, operation, labels):
+        self._registry = registry
+        self._operation = operation
+        self._labels = labels
+        self.documents = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.error = False
+
+    def count(self, docs):
+        self.documents = len(docs)
+        if self._registry.measure_bytes:
+            self.bytes = sum(len(BSON.encode(doc)) for doc in docs if isinstance(doc, dict))
+        return docs
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self._started
+        self._registry.observe(self._operation, self.seconds, self.documents, self.bytes,
+                               error=self.error or exc_type is not None, **self._labels)
+        return False
+
+
+class MetricsRegistry:
+    # Thread-safe collection of LatencyHistograms keyed by operation and labels
+
+    def __init__(self, measure_bytes=None):
+        if measure_bytes is None:
+            measure_bytes = os.getenv('SHELTER_METRICS_BYTES', '0') == '1'
+        self.measure_bytes = measure_bytes  # BSON-encoding results costs time, so it's opt-in
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def timer(self, operation, **labels):
+        return Timer(self, operation, labels)
+
+    def observe(self, operation, seconds, documents=0, size=0, error=False, **labels):
+        key = (operation, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = LatencyHistogram()
+            histogram.observe(seconds, documents, size, error)
+
+    def snapshot(self):
+        # Plain-dict view for logging or JSON endpoints
+        with self._lock:
+            return [{
+                'operation': operation,
+                'labels': dict(labels),
+                'count': h.count,
+                'errors': h.errors,
+                'documents': h.documents,
+                'bytes': h.bytes,
+                'mean_ms': h.total_seconds / h.count * 1000 if h.count else 0.0,
+                **{f'p{int(q * 100)}_ms': v * 1000 for q, v in h.quantiles().items()},
+            } for (operation, labels), h in self._histograms.items()]
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def prometheus_text(self, prefix='shelter'):
+        # Render every histogram in the Prometheus text exposition format
+        lines = [
+            f'# HELP {prefix}_operation_seconds Latency of AnimalShelter operations.',
+            f'# TYPE {prefix}_operation_seconds histogram',
+        ]
+        quantile_lines, doc_lines, byte_lines, error_lines = [], [], [], []
+        with self._lock:
+            items = sorted(self._histograms.items())
+            for (operation, labels), h in items:
+                base = [('operation', operation)] + list(labels)
+                for bound, value in zip(LATENCY_BUCKETS, h.buckets):
+                    lines.append(f'{prefix}_operation_seconds_bucket{_labels(base + [("le", bound)])} {value}')
+                lines.append(f'{prefix}_operation_seconds_bucket{_labels(base + [("le", "+Inf")])} {h.count}')
+                lines.append(f'{prefix}_operation_seconds_sum{_labels(base)} {h.total_seconds:.6f}')
+                lines.append(f'{prefix}_operation_seconds_count{_labels(base)} {h.count}')
+                for q, value in h.quantiles().items():
+                    quantile_lines.append(
+                        f'{prefix}_operation_latency_quantile_seconds{_labels(base + [("quantile", q)])} {value:.6f}')
+                doc_lines.append(f'{prefix}_operation_documents_total{_labels(base)} {h.documents}')
+                byte_lines.append(f'{prefix}_operation_bytes_total{_labels(base)} {h.bytes}')
+                error_lines.append(f'{prefix}_operation_errors_total{_labels(base)} {h.errors}')
+
+        lines += [f'# HELP {prefix}_operation_latency_quantile_seconds Recent latency quantiles.',
+                  f'# TYPE {prefix}_operation_latency_quantile_seconds gauge'] + quantile_lines
+        lines += [f'# HELP {prefix}_operation_documents_total Documents returned or written.',
+                  f'# TYPE {prefix}_operation_documents_total counter'] + doc_lines
+        lines += [f'# HELP {prefix}_operation_bytes_total Bytes returned: BSON for queries '
+                  '(SHELTER_METRICS_BYTES=1), JSON for callback responses.',
+                  f'# TYPE {prefix}_operation_bytes_total counter'] + byte_lines
+        lines += [f'# HELP {prefix}_operation_errors_total Operations that raised.',
+                  f'# TYPE {prefix}_operation_errors_total counter'] + error_lines
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(pairs):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{k}="{escape(v)}"' for k, v in pairs) + '}'
+
+
+# Default registry shared by every AnimalShelter unless one is passed in
+REGISTRY = MetricsRegistry()
@@ -0,0 +1,231 @@
+# live_view.py
+import logging
+import threading
+import uuid
+from collections import deque
+
+from pymongo import DESCENDING
+from pymongo.errors import PyMongoError
+
+from models import Animal
+
+logger = logging.getLogger('shelter.live_view')
+
+DEFAULT_HISTORY = 256  # deltas kept per filter for clients that fall behind
+MAX_EVENTS_PER_POLL = 1000
+
+
+class ChangeStreamFeed:
+    # Reads a collection's change stream without blocking: poll() drains whatever
+    # events are waiting and returns them as ('upsert' | 'delete' | 'reset', _id).
+    # Needs a replica set or sharded cluster; open_feed() falls back to polling otherwise.
+
+    def __init__(self, collection):
+        self._collection = collection
+        self._resume_token = None
+        self._stream = collection.watch(max_await_time_ms=1)
+
+    def poll(self, limit=MAX_EVENTS_PER_POLL):
+        events = []
+        try:
+            while len(events) < limit:
+                change = self._stream.try_next()
+                if change is None:
+                    break
+                self._resume_token = change['_id']
+                events.append(self._event(change))
+        except PyMongoError as e:
+            # Resume where we left off; if the token has expired the view has to reload
+            logger.warning("Change stream interrupted (%s); resuming", e)
+            try:
+                self._stream = self._collection.watch(max_await_time_ms=1, resume_after=self._resume_token)
+            except PyMongoError:
+                self._stream = self._collection.watch(max_await_time_ms=1)
+                events.append(('reset', None))
+        return events
+
+    @staticmethod
+    def _event(change):
+        operation = change['operationType']
+        if operation in ('insert', 'update', 'replace'):
+            return 'upsert', change['documentKey']['_id']
+        if operation == 'delete':
+            return 'delete', change['documentKey']['_id']
+        return 'reset', None  # drop, rename, invalidate: nothing incremental to apply
+
+    def close(self):
+        self._stream.close()
+
+
+class PollingFeed:
+    # Fallback for standalone servers and mongomock: finds documents with an _id (or
+    # `timestamp_field`) greater than the last one seen. ObjectIds grow with insert time,
+    # so _id polling picks up inserts; updates are only seen when the collection carries
+    # a modification timestamp, and deletes need a change stream.
+
+    def __init__(self, collection, timestamp_field=None):
+        self._collection = collection
+        self._field = timestamp_field or '_id'
+        self._last = self._latest()
+
+    def _latest(self):
+        doc = next(iter(self._collection.find({}, {self._field: 1}).sort(self._field, DESCENDING).limit(1)), None)
+        return doc.get(self._field) if doc else None
+
+    def poll(self, limit=MAX_EVENTS_PER_POLL):
+        query = {self._field: {'$gt': self._last}} if self._last is not None else {}
+        docs = list(self._collection.find(query, {self._field: 1}).sort(self._field, 1).limit(limit))
+        if docs:
+            self._last = docs[-1].get(self._field, self._last)
+        return [('upsert', doc['_id']) for doc in docs]
+
+    def close(self):
+        pass
+
+
+def open_feed(collection, mode='auto', timestamp_field=None):
+    # 'stream', 'poll' or 'auto' (change stream when the server supports it)
+    if mode in ('auto', 'stream'):
+        try:
+            return ChangeStreamFeed(collection)
+        except Exception as e:
+            if mode == 'stream':
+                raise
+            logger.info("Change streams unavailable (%s); polling instead", e)
+    return PollingFeed(collection, timestamp_field)
+
+
+class LiveView:
+    # Incrementally maintained in-memory result set for each named filter. Each filter
+    # is loaded once on first use; after that refresh() applies only the documents that
+    # changed, re-checking them against every filter with one _id lookup, and records the
+    # delta under a new version number. Callers keep the version they last saw and ask
+    # changes_since(), so a live update costs O(changes) instead of O(result set).
+    # Rows are held as compact Animal objects and turned back into dicts on the way out.
+    # Versions only mean something inside one process, so clients also keep `instance`;
+    # under a multi-worker server a request may reach a worker with a different history.
+
+    def __init__(self, shelter, filters, projection=None, feed=None, mode='auto', history=DEFAULT_HISTORY,
+                 key=None):
+        from crud import DEFAULT_PROJECTION, ROW_KEY
+
+        self._shelter = shelter
+        self._filters = dict(filters)
+        self._projection = dict(projection if projection is not None else DEFAULT_PROJECTION)
+        self._projection.pop('_id', None)  # the view is keyed on _id, rows are stripped of it
+        self._feed = feed
+        self._mode = mode
+        self.key = key or ROW_KEY  # row field clients use to find a changed row on their side
+        self._rows = {}  # name -> {_id: Animal}
+        self._versions = {name: 0 for name in self._filters}
+        self._deltas = {name: deque(maxlen=history) for name in self._filters}
+        self._lock = threading.RLock()
+        self.instance = uuid.uuid4().hex  # identifies this view's version history
+
+    @property
+    def feed(self):
+        # Opened lazily, before the first load, so no change between load and watch is lost
+        if self._feed is None:
+            self._feed = open_feed(self._shelter.collection, self._mode)
+        return self._feed
+
+    def _load(self, name):
+        _ = self.feed  # start watching before reading the snapshot
+        docs = self._shelter.collection.find(self._filters[name] or {}, self._projection or None)
+        self._rows[name] = {doc.pop('_id'): Animal.from_document(doc, validate=False) for doc in docs}
+        logger.info("Loaded live view %s (%d rows)", name, len(self._rows[name]))
+
+    def rows(self, name):
+        # Current result set for a filter, as a list of row dicts
+        with self._lock:
+            if name not in self._rows:
+                self._load(name)
+            return [animal.to_document() for animal in self._rows[name].values()]
+
+    def total(self, name):
+        with self._lock:
+            if name not in self._rows:
+                self._load(name)
+            return len(self._rows[name])
+
+    def version(self, name):
+        return self._versions[name]
+
+    def refresh(self):
+        # Apply pending changes to every loaded filter. Returns the number of changed documents.
+        with self._lock:
+            events = self.feed.poll()
+            if not events:
+                return 0
+            if any(op == 'reset' for op, _ in events):
+                self._reset()
+                return len(events)
+
+            changed = {doc_id for op, doc_id in events if op == 'upsert'}
+            deleted = {doc_id for op, doc_id in events if op == 'delete'} - changed
+            for name in list(self._rows):
+                self._apply(name, changed, deleted)
+            return len(changed) + len(deleted)
+
+    def _apply(self, name, changed, deleted):
+        rows = self._rows[name]
+        matched = {}
+        if changed:
+            criteria = self._filters[name]
+            query = {'_id': {'$in': list(changed)}}
+            if criteria:
+                query = {'$and': [criteria, query]}
+            matched = {doc.pop('_id'): Animal.from_document(doc, validate=False)
+                       for doc in self._shelter.collection.find(query, self._projection or None)}
+
+        upserts = []
+        for doc_id, animal in matched.items():
+            if rows.get(doc_id) != animal:
+                rows[doc_id] = animal
+                upserts.append((doc_id, animal))
+        # Changed documents that no longer match leave the view, as do deleted ones
+        removes = [(doc_id, rows.pop(doc_id)) for doc_id in (changed - matched.keys()) | deleted if doc_id in rows]
+
+        if upserts or removes:
+            self._versions[name] += 1
+            self._deltas[name].append((self._versions[name], upserts, removes))
+
+    def _reset(self):
+        # The stream can't describe what happened (e.g. the collection was dropped): reload
+        for name in list(self._rows):
+            self._load(name)
+            self._versions[name] += 1
+            self._deltas[name].clear()
+
+    def changes_since(self, name, version, instance=None):
+        # Returns (current_version, delta). delta is {'upserts': [...], 'removes': [...]}
+        # merged over every version after `version` (empty if nothing changed), or None
+        # when `version` is too old for the kept history, or was issued by another view
+        # (`instance` isn't this one's), and the caller must reload.
+        with self._lock:
+            current = self._versions[name]
+            if instance != self.instance:
+                return current, None
+            if version == current:
+                return current, {'upserts': [], 'removes': []}
+            deltas = self._deltas[name]
+            if version is None or version > current or not deltas or deltas[0][0] > version + 1:
+                return current, None
+
+            # Merged per document (_id), so two rows sharing a field value stay apart
+            merged = {}
+            for delta_version, upserts, removes in deltas:
+                if delta_version <= version:
+                    continue
+                for doc_id, animal in upserts:
+                    merged[doc_id] = ('upsert', animal.to_document())
+                for doc_id, animal in removes:
+                    merged[doc_id] = ('remove', animal.to_document())
+            return current, {
+                'upserts': [row for op, row in merged.values() if op == 'upsert'],
+                'removes': [row for op, row in merged.values() if op == 'remove'],
+            }
+
+    def close(self):
+        if self._feed is not None:
+            self._feed.close()
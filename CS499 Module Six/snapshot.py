@@ -0,0 +1,140 @@
+# snapshot.py
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from bson import json_util
+
+from columnar import read_columns
+from models import ANIMAL_FIELDS
+
+# Columns kept in a snapshot: every AAC field (text dictionary-encoded, numbers as float64
+# with NaN for missing values) plus the derived rescue_categories lists the rescue filters
+# use. Fields outside the AAC schema are not kept.
+SNAPSHOT_COLUMNS = {field: 'category' if kind is str else 'float64' for field, kind in ANIMAL_FIELDS.items()}
+SNAPSHOT_COLUMNS['rescue_categories'] = 'object'
+
+DEFAULT_SNAPSHOT = 'shelter_snapshot'
+SNAPSHOT_VERSION = 2
+MANIFEST = 'manifest.json'
+
+# On disk a snapshot is a directory holding one .npy file per column (float64 values, or
+# int32 dictionary codes for text and list columns) and a manifest with the dictionaries,
+# the row count and the watermark: the largest _id in the snapshot. Readers memory-map the
+# .npy files, so every process opening the same snapshot shares one page-cached copy.
+
+
+def encode_lists(values):
+    # Dictionary-encode a column of lists as (int32 codes, [tuple, ...]); a missing list
+    # gets code -1 like a missing text value. Distinct category combinations are few.
+    combos, codes = {}, np.empty(len(values), dtype=np.int32)
+    for row, value in enumerate(values):
+        if isinstance(value, list):
+            codes[row] = combos.setdefault(tuple(value), len(combos))
+        else:
+            codes[row] = -1
+    return codes, list(combos)
+
+
+def collection_columns(collection, query=None, batch_size=1000):
+    # Stream the documents matching query into snapshot columns in _id order.
+    # Returns (columns, watermark): the largest _id read, or None if nothing matched.
+    projection = dict({name: 1 for name in SNAPSHOT_COLUMNS}, _id=1)
+    last = {'_id': None}
+
+    def tracked(cursor):
+        for doc in cursor:
+            last['_id'] = doc.pop('_id')
+            yield doc
+
+    cursor = collection.find(query or {}, projection).sort('_id', 1).batch_size(batch_size)
+    columns = read_columns(tracked(cursor), SNAPSHOT_COLUMNS).arrays()
+    columns['rescue_categories'] = encode_lists(columns['rescue_categories'])
+    return columns, last['_id']
+
+
+def write_snapshot(columns, path, watermark=None):
+    # Write snapshot columns to the directory `path`. `columns` is a dict or an iterable
+    # of (name, column) pairs, so columns can be produced one at a time. The new snapshot
+    # is built beside the old one and swapped in with renames; processes still mapping
+    # the old files keep reading them until they reopen.
+    parent = os.path.dirname(os.path.abspath(path))
+    building = tempfile.mkdtemp(dir=parent, prefix='.snapshot-')
+    try:
+        manifest = {'version': SNAPSHOT_VERSION, 'saved_at': time.time(), 'watermark': watermark,
+                    'rows': 0, 'columns': {}}
+        for name, column in (columns.items() if hasattr(columns, 'items') else columns):
+            if isinstance(column, tuple):
+                codes, categories = column
+                np.save(os.path.join(building, f'{name}.npy'), np.asarray(codes, dtype=np.int32))
+                kind = 'list' if SNAPSHOT_COLUMNS.get(name) == 'object' else 'category'
+                manifest['columns'][name] = {'kind': kind, 'categories': [
+                    list(value) if kind == 'list' else value for value in categories]}
+                manifest['rows'] = len(codes)
+            else:
+                np.save(os.path.join(building, f'{name}.npy'), np.asarray(column, dtype=np.float64))
+                manifest['columns'][name] = {'kind': 'float64'}
+                manifest['rows'] = len(column)
+        with open(os.path.join(building, MANIFEST), 'w', encoding='utf-8') as f:
+            f.write(json_util.dumps(manifest))
+
+        retired = None
+        if os.path.exists(path):
+            retired = tempfile.mkdtemp(dir=parent, prefix='.retired-')
+            os.rmdir(retired)
+            os.replace(path, retired)
+        os.replace(building, path)
+        if retired:
+            shutil.rmtree(retired, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(building, ignore_errors=True)
+        raise
+    return manifest
+
+
+def read_snapshot(path):
+    # Memory-map a snapshot directory. Returns (columns, manifest); columns hold read-only
+    # np.memmap arrays, with (codes, categories) pairs for text and list columns.
+    with open(os.path.join(path, MANIFEST), encoding='utf-8') as f:
+        manifest = json_util.loads(f.read())
+    if manifest.get('version') != SNAPSHOT_VERSION:
+        raise ValueError(f"{path} is a version {manifest.get('version')} snapshot; rebuild it.")
+    columns = {}
+    for name, spec in manifest['columns'].items():
+        array = np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+        if spec['kind'] == 'float64':
+            columns[name] = array
+        elif spec['kind'] == 'list':
+            columns[name] = (array, [tuple(value) for value in spec['categories']])
+        else:
+            columns[name] = (array, spec['categories'])
+    return columns, manifest
+
+
+def append_columns(columns, extra):
+    # Columns with the rows of `extra` added after those of `columns`. Dictionaries are
+    # extended, so existing codes stay valid and new values get new codes.
+    return dict(iter_appended(columns, extra))
+
+
+def iter_appended(columns, extra):
+    # append_columns one column at a time, as (name, column) pairs: writing these with
+    # write_snapshot only ever holds one merged column in memory
+    for name, column in columns.items():
+        addition = extra[name]
+        if isinstance(column, tuple):
+            codes, categories = column
+            new_codes, new_categories = addition
+            categories = list(categories)
+            lookup = {value: code for code, value in enumerate(categories)}
+            remap = np.empty(len(new_categories) + 1, dtype=np.int32)
+            for code, value in enumerate(new_categories):
+                remap[code] = lookup.setdefault(value, len(lookup))
+                if remap[code] == len(categories):
+                    categories.append(value)
+            remap[-1] = -1
+            yield name, (np.concatenate([codes, remap[new_codes]]), categories)
+        else:
+            yield name, np.concatenate([column, addition])
@@ -0,0 +1,247 @@
+# summaries.py
+import hashlib
+import json
+import logging
+import math
+from collections import Counter
+from datetime import datetime, timezone
+
+from pymongo import ASCENDING, UpdateOne
+
+from rescue_profiles import central_angle
+
+logger = logging.getLogger('shelter.summaries')
+
+SUMMARY_COLLECTION = 'rescue_summaries'
+GEO_CELL_DEGREES = 0.05  # roughly 5 km squares around Austin
+WEEKS_PER_YEAR = 52
+
+# Fields a document needs for rescue matching and for every summary dimension
+SUMMARY_FIELDS = {'animal_id': 1, 'breed': 1, 'sex_upon_outcome': 1, 'rescue_categories': 1,
+                  'age_upon_outcome_in_weeks': 1, 'location_lat': 1, 'location_long': 1, 'location': 1}
+
+_NUMBER = {'$type': 'number'}
+
+
+def criteria_hash(criteria):
+    # Stable digest of a rescue filter, stored with the summary built from it
+    return hashlib.sha1(json.dumps(criteria, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def matches(doc, criteria):
+    # Evaluate the simple criteria rescue filters use (equality, array membership,
+    # $eq/$ne/$in/$gt/$gte/$lt/$lte, $geoWithin/$centerSphere and $and) against a document in Python
+    for field, condition in (criteria or {}).items():
+        if field == '$and':
+            if not all(matches(doc, clause) for clause in condition):
+                return False
+            continue
+        value = doc.get(field)
+        values = value if isinstance(value, list) else [value]
+        if isinstance(condition, dict) and any(k.startswith('$') for k in condition):
+            if not all(_compare(values, op, operand) for op, operand in condition.items()):
+                return False
+        elif condition not in values:
+            return False
+    return True
+
+
+def _compare(values, op, operand):
+    def test(value):
+        try:
+            if op == '$eq':
+                return value == operand
+            if op == '$in':
+                return value in operand
+            if op == '$gt':
+                return value is not None and value > operand
+            if op == '$gte':
+                return value is not None and value >= operand
+            if op == '$lt':
+                return value is not None and value < operand
+            if op == '$lte':
+                return value is not None and value <= operand
+            if op == '$geoWithin' and '$centerSphere' in operand:
+                (long, lat), radius = operand['$centerSphere']
+                point_long, point_lat = value['coordinates']
+                return central_angle(lat, long, point_lat, point_long) <= radius
+        except (TypeError, KeyError, ValueError):
+            return False
+        raise ValueError(f"Unsupported operator in summary criteria: {op}")
+
+    if op == '$ne':
+        return operand not in values
+    if op == '$nin':
+        return not any(value in operand for value in values)
+    return any(test(value) for value in values)
+
+
+def _number(value):
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def summary_keys(doc):
+    # (dimension, key) pairs one document contributes to a rescue type's summary
+    animal_id = doc.get('animal_id')
+    keys = [('total', None), ('animal', animal_id if animal_id is not None else doc.get('_id')),
+            ('breed', doc.get('breed'))]
+    weeks = _number(doc.get('age_upon_outcome_in_weeks'))
+    if weeks is not None:
+        keys.append(('age', float(math.floor(weeks / WEEKS_PER_YEAR))))
+    lat, long = _number(doc.get('location_lat')), _number(doc.get('location_long'))
+    if lat is not None and long is not None:
+        keys.append(('geo', {'lat': float(math.floor(lat / GEO_CELL_DEGREES)),
+                             'long': float(math.floor(long / GEO_CELL_DEGREES))}))
+    return keys
+
+
+class RescueSummaries:
+    # Materialized per-rescue-type summaries in their own collection: one small document
+    # per (rescue, dimension, key) holding a count, for dimensions total, animal (matching
+    # animal_ids), breed, age (whole years) and geo (GEO_CELL_DEGREES grid cells).
+    # AnimalShelter keeps them current on every write with $inc upserts computed from the
+    # documents before and after the write; rebuild() recomputes them from scratch with
+    # one $group ... $merge aggregation per rescue type and dimension.
+    # The meta document records a hash of the criteria a summary was built from; once a
+    # rescue profile changes, its summary reads as not built until it is rebuilt.
+
+    def __init__(self, animals, summaries, filters):
+        self._animals = animals
+        self._summaries = summaries
+        self.filters = dict(filters)
+        self._hashes = {name: criteria_hash(criteria) for name, criteria in self.filters.items()}
+        self._stale = set()  # rescue types already reported as built from other criteria
+
+    def fetch(self, query):
+        # Current summary inputs of the documents matching query, for apply()
+        return list(self._animals.find(query, SUMMARY_FIELDS))
+
+    def apply(self, before, after):
+        # Fold a write into the summaries: `before`/`after` are the affected documents
+        # (with SUMMARY_FIELDS) as they were and are now; either may be empty.
+        # Returns the number of summary documents touched.
+        requests = self.requests(before, after)
+        if requests:
+            self._summaries.bulk_write(requests, ordered=False)
+        return len(requests)
+
+    def requests(self, before, after):
+        # The $inc upserts apply() sends, for callers writing them themselves (async_crud)
+        changes, ids = Counter(), {}
+        for docs, sign in ((before, -1), (after, 1)):
+            for doc in docs:
+                for name, criteria in self.filters.items():
+                    if matches(doc, criteria):
+                        for dim, key in summary_keys(doc):
+                            hashable = (name, dim, tuple(key.items()) if isinstance(key, dict) else key)
+                            changes[hashable] += sign
+                            # Field order is part of an embedded _id, so build it the way $group does
+                            ids[hashable] = {'rescue': name, 'dim': dim, 'key': key}
+        return [UpdateOne({'_id': ids[hashable]},
+                          {'$inc': {'count': delta}, '$set': {'rescue': hashable[0], 'dim': hashable[1]}},
+                          upsert=True)
+                for hashable, delta in changes.items() if delta]
+
+    def rebuild(self, names=None):
+        # Recompute the named (default: all) rescue types server-side and stamp them as built
+        for name in names or self.filters:
+            self._summaries.delete_many({'rescue': name})
+            for dim, pipeline in self._pipelines(name).items():
+                self._animals.aggregate(pipeline + [{'$merge': {
+                    'into': self._summaries.name, 'on': '_id', 'whenMatched': 'replace', 'whenNotMatched': 'insert',
+                }}])
+            self._summaries.replace_one({'_id': {'rescue': name, 'dim': 'meta', 'key': None}},
+                                        {'rescue': name, 'dim': 'meta', 'built_at': datetime.now(timezone.utc),
+                                         'criteria_hash': self._hashes[name]},
+                                        upsert=True)
+            self._stale.discard(name)
+            logger.info("Rebuilt %s summary", name)
+        self.ensure_indexes()
+
+    def _pipelines(self, name):
+        # One $group pipeline per dimension, grouping exactly as summary_keys() does
+        criteria = self.filters[name] or {}
+
+        def grouped(dim, key, match=None):
+            return [
+                {'$match': {'$and': [criteria, match]} if match else criteria},
+                {'$group': {'_id': {'rescue': name, 'dim': dim, 'key': key}, 'count': {'$sum': 1}}},
+                {'$addFields': {'rescue': name, 'dim': dim}},
+            ]
+
+        def cell(field):
+            return {'$floor': {'$divide': [f'${field}', GEO_CELL_DEGREES]}}
+
+        return {
+            'total': grouped('total', None),
+            'animal': grouped('animal', {'$ifNull': ['$animal_id', '$_id']}),
+            'breed': grouped('breed', '$breed'),
+            'age': grouped('age', {'$floor': {'$divide': ['$age_upon_outcome_in_weeks', WEEKS_PER_YEAR]}},
+                           {'age_upon_outcome_in_weeks': _NUMBER}),
+            'geo': grouped('geo', {'lat': cell('location_lat'), 'long': cell('location_long')},
+                           {'location_lat': _NUMBER, 'location_long': _NUMBER}),
+        }
+
+    def ensure_indexes(self):
+        self._summaries.create_index([('rescue', ASCENDING), ('dim', ASCENDING)], name='rescue_dim')
+
+    def get(self, name):
+        # Decoded summary for one rescue type, or None if it has never been built:
+        # {'total', 'animal_ids', 'breed_counts', 'age_histogram', 'geo_buckets', 'built_at'}
+        docs = list(self._summaries.find({'rescue': name}))
+        meta = next((doc for doc in docs if doc['dim'] == 'meta'), None)
+        if not self._current(name, meta):
+            return None
+        summary = {'total': 0, 'animal_ids': [], 'breed_counts': [], 'age_histogram': [], 'geo_buckets': [],
+                   'built_at': meta.get('built_at')}
+        for doc in docs:
+            dim, key, count = doc['dim'], doc['_id'].get('key'), doc.get('count', 0)
+            if count <= 0:
+                continue
+            if dim == 'total':
+                summary['total'] = count
+            elif dim == 'animal':
+                summary['animal_ids'].append(key)
+            elif dim == 'breed':
+                summary['breed_counts'].append((key, count))
+            elif dim == 'age':
+                summary['age_histogram'].append((int(key), count))
+            elif dim == 'geo':
+                summary['geo_buckets'].append(((key['lat'] + 0.5) * GEO_CELL_DEGREES,
+                                               (key['long'] + 0.5) * GEO_CELL_DEGREES, count))
+        summary['breed_counts'].sort(key=lambda pair: (-pair[1], str(pair[0])))
+        summary['age_histogram'].sort()
+        return summary
+
+    def _current(self, name, meta):
+        # Whether a meta document says the summary was built from the current criteria
+        if meta is None:
+            return False
+        if meta.get('criteria_hash') != self._hashes.get(name):
+            if name not in self._stale:
+                self._stale.add(name)
+                logger.warning("%s summary was built from other criteria; run rebuild_summaries", name)
+            return False
+        return True
+
+    def get_counts(self, name, dim='breed'):
+        # [(key, count), ...] for one dimension, most common first; None if never built
+        counts = self.get_dims(name, [dim])
+        return None if counts is None else counts[dim]
+
+    def get_dims(self, name, dims):
+        # {dim: [(key, count), ...]} for several dimensions, each most common first, read
+        # together with the meta document in one query; None if never built
+        docs = self._summaries.find({'rescue': name, 'dim': {'$in': ['meta', *dims]}},
+                                    {'dim': 1, 'count': 1, 'criteria_hash': 1})
+        counts, meta = {dim: [] for dim in dims}, None
+        for doc in docs:
+            if doc['dim'] == 'meta':
+                meta = doc
+            elif doc.get('count', 0) > 0:
+                counts[doc['dim']].append((doc['_id']['key'], doc['count']))
+        if not self._current(name, meta):
+            return None
+        for pairs in counts.values():
+            pairs.sort(key=lambda pair: (-pair[1], str(pair[0])))
+        return counts
@@ -0,0 +1,16 @@
+# wsgi.py
+"""
+Production entry point for the dashboard. Serve the Flask app behind Dash with a
+multi-worker WSGI server instead of `python main.py`'s single-process debug server:
+
+    gunicorn --workers 4 --bind 0.0.0.0:8050 wsgi:application
+
+main.py builds nothing that touches MongoDB or disk at import, so workers may be
+forked from a preloaded master (--preload); each worker connects on first use.
+Set SHELTER_CACHE_DIR (e.g. /dev/shm/shelter-cache) so workers share query results.
+The directory is created private to the server's user; one that another user owns
+or can write to is refused, since cached entries are unpickled.
+"""
+from main import app
+
+application = app.server